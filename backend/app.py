@@ -1,13 +1,30 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from config import settings
 from routes import app_routes
+from services import sentiment_service
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm the model in the background so `/` answers while it loads;
+    # `/ready` reports when inference is available.
+    warm_up = None
+    if settings.MODEL_WARMUP_ON_STARTUP:
+        warm_up = asyncio.create_task(sentiment_service.warm_up())
+    yield
+    if warm_up is not None and not warm_up.done():
+        warm_up.cancel()
+    await sentiment_service.close()
 
 def create_app() -> FastAPI:
     app = FastAPI(
         title="Google Play Store Review Sentiment Analyzer",
         description="API for analyzing sentiment of Google Play Store reviews",
-        version="1.0.0"
+        version="1.0.0",
+        lifespan=lifespan
     )
     
     app.add_middleware(
@@ -14,9 +14,65 @@ class Settings(BaseSettings):
     ALLOWED_ORIGINS: List[str] = os.getenv("ALLOWED_ORIGINS", "http://localhost:3000").split(",")
     
     DEFAULT_REVIEWS_COUNT: int = 100
+    REVIEWS_PAGE_SIZE: int = 50  # reviews per scraper request (max 199)
+    SCRAPE_MAX_CONCURRENCY: int = 8  # concurrent Play Store requests per process
     BATCH_SIZE: int = 5
     BATCH_DELAY: float = 1.0  # seconds
 
+    # Sentiment model, pinned so scores are reproducible
+    SENTIMENT_MODEL_NAME: str = "distilbert/distilbert-base-uncased-finetuned-sst-2-english"
+    SENTIMENT_MODEL_REVISION: str = "714eb0f"
+    SENTIMENT_MODEL_PATH: str = ""  # local directory; loads without network access
+    MODEL_OFFLINE: bool = False  # only use files already in the local Hugging Face cache
+    MODEL_WARMUP_ON_STARTUP: bool = True
+
+    # Inference backend: "torch", "torch-int8" (dynamic quantization) or "onnx"
+    INFERENCE_BACKEND: str = "torch"
+    INFERENCE_INTRA_OP_THREADS: int = 0  # 0 keeps the library default
+    ONNX_MODEL_PATH: str = ""  # defaults to data/onnx/<model>.onnx, exported on first use
+
+    # Optional out-of-process inference pool
+    INFERENCE_POOL_WORKERS: int = 0  # 0 runs inference in the API process
+    INFERENCE_POOL_THREADS: int = 1  # torch/onnx threads per worker process
+    INFERENCE_POOL_ADDRESS: str = ""  # host:port of a standalone pool shared by all API workers
+    INFERENCE_POOL_AUTHKEY: str = ""  # shared secret, required for the standalone pool and its clients
+    INFERENCE_POOL_TIMEOUT: float = 120.0  # seconds to wait for a batch
+
+    # Tokenization: truncation ("head" or "head_tail") and length bucketing
+    INFERENCE_MAX_TOKENS: int = 256  # including special tokens; model limit is 512
+    INFERENCE_TRUNCATION: str = "head_tail"
+    INFERENCE_TRUNCATION_HEAD_TOKENS: int = 64  # tokens kept from the start with head_tail
+    INFERENCE_MAX_PADDING_RATIO: float = 0.25  # split batches when padding exceeds this share
+    TOKEN_CACHE_SIZE: int = 10000
+
+    # Micro-batching inference engine
+    INFERENCE_MAX_BATCH_SIZE: int = 32
+    INFERENCE_MAX_WAIT_MS: float = 10.0  # max time to hold a partial batch
+    INFERENCE_MAX_CONCURRENT_BATCHES: int = 0  # 0 = one per local pool worker (1 in-process)
+
+    # Result cache: in-process LRU in front of a shared SQLite file
+    CACHE_TTL_SECONDS: float = 180.0
+    CACHE_STALE_TTL_SECONDS: float = 600.0  # serve stale entries this long while refreshing
+    CACHE_MAX_ENTRIES: int = 512
+    CACHE_MAX_BYTES: int = 32 * 1024 * 1024
+    CACHE_DB_PATH: str = "data/analysis_cache.sqlite3"  # empty disables the disk tier
+    CACHE_DISK_MAX_ENTRIES: int = 10000
+
+    # Per-review score store for incremental re-analysis
+    SCORE_STORE_PATH: str = "data/review_scores.sqlite3"  # empty disables it
+    SCORE_STORE_MAX_REVIEWS_PER_APP: int = 1000
+
+    # App name resolution and autocomplete
+    APP_ID_CACHE_TTL_SECONDS: float = 24 * 3600.0
+    APP_ID_CACHE_MAX_ENTRIES: int = 10000
+    SEARCH_CACHE_TTL_SECONDS: float = 3600.0  # reuse live search results per query
+    SEARCH_CACHE_MAX_ENTRIES: int = 5000
+    APP_INDEX_MAX_RECORDS: int = 50000  # apps kept in the local autocomplete index
+    APP_INDEX_MIN_RESULTS: int = 5  # local matches needed to skip the live search
+
+    # Bulk analysis
+    BULK_MAX_APPS: int = 100  # apps accepted per /analyze/bulk request
+
     class Config:
         env_file = ".env"
 
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 
 class AppRequest(BaseModel):
     appName: str
@@ -16,3 +16,19 @@ class AnalysisResponse(BaseModel):
 class AppInfo(BaseModel):
     appId: str
     title: str
+
+class BulkAnalysisRequest(BaseModel):
+    appNames: List[str] = []
+    appIds: List[str] = []
+
+class BulkAnalysisEntry(BaseModel):
+    appName: Optional[str] = None
+    appId: Optional[str] = None
+    status: int
+    result: Optional[AnalysisResponse] = None
+    error: Optional[str] = None
+
+class BulkAnalysisResponse(BaseModel):
+    results: List[BulkAnalysisEntry]
+    succeeded: int
+    failed: int
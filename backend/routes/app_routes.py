@@ -1,16 +1,13 @@
-import asyncio
+import json
 import logging
 from typing import List, Dict, Any
-from datetime import datetime, timedelta
 
-from fastapi import APIRouter, HTTPException
-from transformers import pipeline
-from aiolimiter import AsyncLimiter
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 
-from models.schemas import AppRequest, AnalysisResponse, AppInfo
-from services import play_store_service
-from services.sentiment_service import analyze_reviews_concurrent, calculate_average_sentiment
+from models.schemas import AppRequest, AnalysisResponse, AppInfo, BulkAnalysisRequest, BulkAnalysisResponse
 from config import settings
+from services import analysis_service, metrics, play_store_service, sentiment_service
 
 logging.basicConfig(
     level=logging.INFO,
@@ -18,90 +15,64 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Sentiment pipeline
-_sentiment = pipeline("sentiment-analysis")
-
-# Concurrency and rate limiting
-MAX_CONCURRENT_WORKERS = 5                # max simultaneous model inferences
-RATE_LIMIT_CALLS = 10                     # max calls per time period
-RATE_LIMIT_PERIOD = 1.0                   # seconds
+router = APIRouter()
 
-_semaphore = asyncio.Semaphore(MAX_CONCURRENT_WORKERS)
-_rate_limiter = AsyncLimiter(RATE_LIMIT_CALLS, RATE_LIMIT_PERIOD)
+@router.post("/analyze", response_model=AnalysisResponse)
+async def analyze_app_reviews(request: AppRequest):
+    logger.info(f"Received analyze request for appName={request.appName}")
+    try:
+        with metrics.REQUESTS_IN_FLIGHT.labels("analyze").track_inprogress():
+            return await analysis_service.analyze_app(request.appName)
 
-# In-memory cache for results
-def _cache_info():
-    return f"Cache TTL={_CACHE_TTL}, current size={len(_ANALYZE_CACHE)}"
+    except HTTPException as http_exc:
+        logger.error(f"HTTPException during analysis: {http_exc.detail}")
+        raise
+    except Exception as e:
+        logger.exception(f"Unexpected error analyzing reviews for appName={request.appName}")
+        raise HTTPException(status_code=500, detail=f"Unexpected error: {e}")
 
-_ANALYZE_CACHE: dict[str, tuple[datetime, AnalysisResponse]] = {}
-_CACHE_TTL = timedelta(minutes=3)
+@router.post("/analyze/bulk", response_model=BulkAnalysisResponse)
+async def analyze_apps_bulk(request: BulkAnalysisRequest):
+    """
+    Analyze a list of app names and/or package IDs in one request. Each
+    entry reports its own status, so one unknown app doesn't fail the rest.
+    """
+    total = len(request.appNames) + len(request.appIds)
+    logger.info(f"Received bulk analyze request for {total} apps")
+    if total == 0:
+        raise HTTPException(status_code=400, detail="Provide at least one app name or ID")
+    if total > settings.BULK_MAX_APPS:
+        raise HTTPException(status_code=400, detail=f"At most {settings.BULK_MAX_APPS} apps per request")
+    try:
+        with metrics.REQUESTS_IN_FLIGHT.labels("analyze_bulk").track_inprogress():
+            return await analysis_service.analyze_bulk(request.appNames, request.appIds)
+    except Exception as e:
+        logger.exception("Unexpected error during bulk analysis")
+        raise HTTPException(status_code=500, detail=f"Unexpected error: {e}")
 
-router = APIRouter()
+def _format_event(event: str, payload: Dict[str, Any], sse: bool) -> str:
+    if sse:
+        return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+    return json.dumps({"event": event, **payload}) + "\n"
 
-async def _analyze_single(text: str) -> Dict[str, Any]:
+@router.post("/analyze/stream")
+async def analyze_app_reviews_stream(request: AppRequest, http_request: Request):
     """
-    Analyze a single review text under concurrency and rate limits.
+    Streaming variant of `/analyze`: emits a `progress` event (running
+    average, count so far, sample reviews) as each page of reviews is
+    scored, then a `result` event with the final AnalysisResponse.
+    NDJSON by default, server-sent events when the client accepts
+    `text/event-stream`.
     """
-    async with _semaphore:
-        async with _rate_limiter:
-            result = await asyncio.to_thread(_sentiment, [text])
-    res = result[0]
-    label = res.get("label", "").upper()
-    score = res.get("score", 0.0)
-    sentiment_score = score if label == "POSITIVE" else -score
-    return {"review_text": text, "sentiment_score": sentiment_score}
-
-@router.post("/analyze", response_model=AnalysisResponse)
-async def analyze_app_reviews(request: AppRequest):
-    logger.info(f"Received analyze request for appName={request.appName}")
-    now = datetime.utcnow()
-
-    # Check cache
-    cached = _ANALYZE_CACHE.get(request.appName)
-    if cached:
-        ts, resp = cached
-        if now - ts < _CACHE_TTL:
-            logger.info(f"Cache hit for appName={request.appName} at {ts.isoformat()}; {_cache_info()}")
-            return resp
-        else:
-            logger.info(f"Cache expired for appName={request.appName} (cached at {ts.isoformat()}); {_cache_info()}")
+    logger.info(f"Received streaming analyze request for appName={request.appName}")
+    sse = "text/event-stream" in http_request.headers.get("accept", "")
+    events = analysis_service.stream_app_analysis(request.appName)
+    in_flight = metrics.REQUESTS_IN_FLIGHT.labels("analyze_stream")
 
+    # Resolve the first event before responding so lookup failures keep their status code
     try:
-        # Get app ID
-        logger.info(f"Fetching app ID for appName={request.appName}")
-        app_id = await play_store_service.get_app_id(request.appName)
-        logger.info(f"Fetched app_id={app_id} for appName={request.appName}")
-
-        # Fetch reviews
-        logger.info(f"Fetching up to {settings.DEFAULT_REVIEWS_COUNT} reviews for app_id={app_id}")
-        reviews = await play_store_service.get_app_reviews(
-            app_id,
-            count=settings.DEFAULT_REVIEWS_COUNT
-        )
-        if not reviews:
-            logger.warning(f"No reviews found for app_id={app_id} (appName={request.appName})")
-            raise HTTPException(status_code=404, detail="No reviews found for this app")
-
-        logger.info(f"Fetched {len(reviews)} reviews for app_id={app_id}")
-
-        # Analyze reviews concurrently
-        analyzed = await analyze_reviews_concurrent(reviews)
-        avg = calculate_average_sentiment(analyzed)
-        logger.info(f"Analyzed {len(analyzed)} reviews for appName={request.appName}, average_sentiment={avg:.4f}")
-
-        # Prepare response
-        response = AnalysisResponse(
-            average_sentiment=avg,
-            reviews_analyzed=len(analyzed),
-            sample_reviews=analyzed[:5]
-        )
-
-        # Cache the response
-        _ANALYZE_CACHE[request.appName] = (now, response)
-        logger.info(f"Cached response for appName={request.appName} at {now.isoformat()}; {_cache_info()}")
-
-        return response
-
+        with in_flight.track_inprogress():
+            first = await events.__anext__()
     except HTTPException as http_exc:
         logger.error(f"HTTPException during analysis: {http_exc.detail}")
         raise
@@ -109,6 +80,30 @@ async def analyze_app_reviews(request: AppRequest):
         logger.exception(f"Unexpected error analyzing reviews for appName={request.appName}")
         raise HTTPException(status_code=500, detail=f"Unexpected error: {e}")
 
+    async def body():
+        # Counted from inside the body, so a body that is never started can't leak the gauge
+        in_flight.inc()
+        try:
+            event, response = first
+            yield _format_event(event, response.model_dump(), sse)
+            async for event, response in events:
+                yield _format_event(event, response.model_dump(), sse)
+        except HTTPException as http_exc:
+            logger.error(f"HTTPException during streaming analysis: {http_exc.detail}")
+            yield _format_event("error", {"status": http_exc.status_code, "detail": http_exc.detail}, sse)
+        except Exception as e:
+            logger.exception(f"Unexpected error streaming analysis for appName={request.appName}")
+            yield _format_event("error", {"status": 500, "detail": f"Unexpected error: {e}"}, sse)
+        finally:
+            in_flight.dec()
+            await events.aclose()
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream" if sse else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @router.get("/search-apps/{query}", response_model=List[AppInfo])
 async def search_app_names(query: str):
     logger.info(f"Received search-apps request for query='{query}'")
@@ -116,13 +111,35 @@ async def search_app_names(query: str):
         logger.info("Query length less than 2; returning empty list")
         return []
     try:
-        results = await play_store_service.search_apps(query)
+        with metrics.REQUESTS_IN_FLIGHT.labels("search_apps").track_inprogress():
+            results = await play_store_service.search_apps(query)
         logger.info(f"Found {len(results)} apps for query='{query}'")
         return results
     except Exception as e:
         logger.exception(f"Error searching apps for query='{query}'")
         raise HTTPException(status_code=500, detail=f"Error searching apps: {e}")
 
+@router.get("/stats")
+async def service_stats():
+    return analysis_service.stats()
+
+@router.get("/metrics")
+async def prometheus_metrics():
+    """
+    Prometheus scrape endpoint (this worker process's metrics).
+    """
+    content, content_type = metrics.render()
+    # Set the header directly; media_type would append a second charset
+    return Response(content=content, headers={"Content-Type": content_type})
+
+@router.get("/ready")
+async def readiness():
+    """
+    Readiness probe: 503 until inference is available. Liveness stays on `/`.
+    """
+    status = sentiment_service.inference_status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
 @router.get("/")
 async def home():
     logger.info("Health check endpoint called")
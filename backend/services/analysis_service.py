@@ -0,0 +1,377 @@
+import asyncio
+import logging
+import sqlite3
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Set, Tuple
+
+from fastapi import HTTPException
+
+from models.schemas import AnalysisResponse, BulkAnalysisEntry, BulkAnalysisResponse
+from services import play_store_service
+from services.app_index import normalize
+from services.cache_service import build_cache
+from services.metrics import span
+from services.score_store import build_score_store, content_hash
+from services.single_flight import SingleFlight
+from services.sentiment_service import calculate_average_sentiment, has_content, model_version, score_texts
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+_cache = build_cache()
+_score_store = build_score_store()
+
+# Concurrent analyses of the same resolved app share one scrape + inference run
+_analysis_flight = SingleFlight()
+# Per app ID, the queues of streams waiting for progress of its in-flight run
+_progress: Dict[str, Set[asyncio.Queue]] = {}
+
+# Strong references to in-progress background refreshes, keyed by cache key
+_refreshing: Set[str] = set()
+_refresh_tasks: Set[asyncio.Task] = set()
+
+
+def _cache_key(app_name: str) -> str:
+    # Same normalization as app ID resolution, so both caches agree on what is one app
+    return normalize(app_name)
+
+
+def stats() -> Dict[str, Any]:
+    return {
+        "cache": {
+            "hits": _cache.hits,
+            "stale_hits": _cache.stale_hits,
+            "misses": _cache.misses,
+            "evictions": _cache.evictions,
+            "memory_entries": len(_cache.memory),
+        },
+        "single_flight": _analysis_flight.stats(),
+        "search": play_store_service.search_stats(),
+    }
+
+
+def _build_response(analyzed: List[Dict[str, Any]]) -> AnalysisResponse:
+    return AnalysisResponse(
+        average_sentiment=calculate_average_sentiment(analyzed),
+        reviews_analyzed=len(analyzed),
+        sample_reviews=analyzed[:5]
+    )
+
+
+async def _iter_app_analysis(app_id: str) -> AsyncIterator[Tuple[bool, AnalysisResponse]]:
+    """
+    Analyze the newest reviews of a resolved app, yielding `(False, partial)`
+    after each page is scored and `(True, final)` at the end.
+
+    Pages are fetched newest first in a background task and unseen (or
+    edited) reviews are scored as soon as their page arrives; reviews
+    without text are skipped. Once a page contains reviews that are
+    already in the score store, fetching stops and the rest of the window
+    is filled from stored scores instead of being re-scored.
+    """
+    count = settings.DEFAULT_REVIEWS_COUNT
+    version = model_version()
+    # Fetched reviews in order with their stored score (None until scored)
+    fetched: List[List[Any]] = []
+    stored_tail: List[Dict[str, Any]] = []
+    # Per page: its scoring task (if anything needed scoring), the positions
+    # in `fetched` that task fills, and how many reviews are fetched so far
+    pages_done: asyncio.Queue = asyncio.Queue()
+    tasks: List[asyncio.Task] = []
+
+    async def _fetch() -> None:
+        nonlocal stored_tail
+        try:
+            async with aclosing(play_store_service.iter_app_reviews(app_id, count=count)) as pages:
+                async for page in pages:
+                    page = [r for r in page if has_content(r)]
+                    digests = [content_hash(r["content"]) for r in page]
+                    known: Dict[Tuple[str, str], float] = {}
+                    if _score_store is not None:
+                        try:
+                            known = await asyncio.to_thread(
+                                _score_store.lookup,
+                                version,
+                                [(r["reviewId"], d) for r, d in zip(page, digests) if r.get("reviewId")],
+                            )
+                        except sqlite3.Error:
+                            # The score store is best effort; unknown reviews are just scored again
+                            logger.exception(f"Failed to look up stored scores for app_id={app_id}")
+                    positions = []
+                    for review, digest in zip(page, digests):
+                        score = known.get((review.get("reviewId"), digest))
+                        if score is None:
+                            positions.append(len(fetched))
+                        fetched.append([review, digest, score])
+                    task = None
+                    if positions:
+                        task = asyncio.create_task(score_texts([fetched[i][0]["content"] for i in positions]))
+                        tasks.append(task)
+                    pages_done.put_nowait((task, positions, len(fetched)))
+
+                    if known:
+                        # Reached already-scored reviews; stop if the store can fill the window
+                        try:
+                            tail = await asyncio.to_thread(
+                                _score_store.recent_reviews,
+                                app_id,
+                                version,
+                                [r.get("reviewId") for r, _, _ in fetched],
+                                count - len(fetched),
+                            )
+                        except sqlite3.Error:
+                            logger.exception(f"Failed to read stored reviews for app_id={app_id}")
+                            tail = []
+                        if len(fetched) + len(tail) >= count:
+                            stored_tail = tail
+                            break
+        finally:
+            pages_done.put_nowait(None)
+
+    logger.debug("Fetching up to %d reviews for app_id=%s", count, app_id)
+    fetcher = asyncio.create_task(_fetch())
+    newly_scored = []
+    try:
+        while True:
+            item = await pages_done.get()
+            if item is None:
+                break
+            task, positions, fetched_so_far = item
+            if task is not None:
+                for i, score in zip(positions, await task):
+                    fetched[i][2] = score
+                    newly_scored.append(tuple(fetched[i]))
+            yield False, _build_response([
+                {"review_text": review["content"], "sentiment_score": score}
+                for review, _, score in fetched[:fetched_so_far]
+            ])
+        # Surfaces fetch errors
+        await fetcher
+    finally:
+        fetcher.cancel()
+        for task in tasks:
+            task.cancel()
+
+    with span("aggregation", app_id=app_id):
+        analyzed: List[Dict[str, Any]] = [
+            {"review_text": review["content"], "sentiment_score": score}
+            for review, _, score in fetched
+        ]
+        analyzed.extend(stored_tail)
+        response = _build_response(analyzed) if analyzed else None
+
+    if not analyzed:
+        logger.warning(f"No reviews found for app_id={app_id}")
+        raise HTTPException(status_code=404, detail="No reviews found for this app")
+
+    if _score_store is not None and newly_scored:
+        try:
+            await asyncio.to_thread(_score_store.save, app_id, version, newly_scored)
+        except sqlite3.Error:
+            logger.exception(f"Failed to persist {len(newly_scored)} review scores for app_id={app_id}")
+
+    logger.info(
+        f"Analyzed {len(analyzed)} reviews for app_id={app_id} "
+        f"({len(newly_scored)} newly scored, {len(analyzed) - len(newly_scored)} from score store), "
+        f"average_sentiment={response.average_sentiment:.4f}"
+    )
+    yield True, response
+
+
+async def _analyze_app_id(app_id: str) -> AnalysisResponse:
+    """
+    Analyze the newest reviews of a resolved app and return the final result.
+    Partial results are published to any streams subscribed to `app_id`.
+    """
+    async with aclosing(_iter_app_analysis(app_id)) as progress:
+        async for final, response in progress:
+            if final:
+                return response
+            for updates in _progress.get(app_id, ()):
+                updates.put_nowait(response)
+    raise RuntimeError(f"Analysis of app_id={app_id} ended without a result")
+
+
+async def _resolve_app_id(app_name: str) -> str:
+    with span("resolve_app_id", app_name=app_name):
+        app_id = await play_store_service.get_app_id(app_name)
+    logger.debug("Resolved appName=%s to app_id=%s", app_name, app_id)
+    return app_id
+
+
+async def compute_analysis(app_name: str) -> AnalysisResponse:
+    """
+    Resolve the app and analyze its newest reviews, bypassing the result
+    cache. Concurrent calls that resolve to the same app ID are coalesced
+    into a single run.
+    """
+    app_id = await _resolve_app_id(app_name)
+
+    if app_id in _analysis_flight:
+        logger.info(f"Coalescing analysis for appName={app_name} onto in-flight run for app_id={app_id}")
+    return await _analysis_flight.do(app_id, lambda: _analyze_app_id(app_id))
+
+
+async def _compute_and_store(key: str, compute: Callable[[], Awaitable[AnalysisResponse]], label: str) -> AnalysisResponse:
+    response = await compute()
+    await _cache.set(key, response.model_dump_json())
+    logger.debug("Cached response for %s; %s", label, _cache)
+    return response
+
+
+async def _refresh(key: str, compute: Callable[[], Awaitable[AnalysisResponse]], label: str) -> None:
+    try:
+        await _compute_and_store(key, compute, label)
+    except Exception:
+        logger.exception(f"Background refresh failed for {label}")
+    finally:
+        _refreshing.discard(key)
+
+
+def _schedule_refresh(key: str, compute: Callable[[], Awaitable[AnalysisResponse]], label: str) -> None:
+    if key in _refreshing:
+        return
+    _refreshing.add(key)
+    task = asyncio.create_task(_refresh(key, compute, label))
+    _refresh_tasks.add(task)
+    task.add_done_callback(_refresh_tasks.discard)
+
+
+async def _cached_analysis(key: str, compute: Callable[[], Awaitable[AnalysisResponse]], label: str) -> AnalysisResponse:
+    """
+    Serve `key` from the result cache when possible. A stale entry is
+    returned immediately while a background task recomputes it
+    (stale-while-revalidate); a miss runs `compute` and caches the result.
+    """
+    cached = await _cache.get(key)
+    if cached is not None:
+        value, fresh = cached
+        response = AnalysisResponse.model_validate_json(value)
+        if fresh:
+            logger.info(f"Cache hit for {label}")
+        else:
+            logger.info(f"Serving stale cache entry for {label}, refreshing in background")
+            _schedule_refresh(key, compute, label)
+        return response
+
+    logger.info(f"Cache miss for {label}")
+    logger.debug("%s", _cache)
+    return await _compute_and_store(key, compute, label)
+
+
+async def analyze_app(app_name: str) -> AnalysisResponse:
+    """
+    Return the analysis for `app_name`, serving from the result cache when
+    possible (stale entries are refreshed in the background).
+    """
+    return await _cached_analysis(
+        _cache_key(app_name), lambda: compute_analysis(app_name), f"appName={app_name}"
+    )
+
+
+async def analyze_app_id(app_id: str) -> AnalysisResponse:
+    """
+    Like `analyze_app` for an already known package ID, skipping name
+    resolution. Shares in-flight runs with name lookups of the same app.
+    """
+    app_id = app_id.strip()
+    return await _cached_analysis(
+        f"id:{app_id}",
+        lambda: _analysis_flight.do(app_id, lambda: _analyze_app_id(app_id)),
+        f"app_id={app_id}",
+    )
+
+
+async def _bulk_entry(compute: Awaitable[AnalysisResponse], **ident: str) -> BulkAnalysisEntry:
+    try:
+        result = await compute
+        return BulkAnalysisEntry(status=200, result=result, **ident)
+    except HTTPException as http_exc:
+        return BulkAnalysisEntry(status=http_exc.status_code, error=str(http_exc.detail), **ident)
+    except Exception as e:
+        logger.exception(f"Unexpected error in bulk analysis for {ident}")
+        return BulkAnalysisEntry(status=500, error=f"Unexpected error: {e}", **ident)
+
+
+async def analyze_bulk(app_names: List[str], app_ids: List[str]) -> BulkAnalysisResponse:
+    """
+    Analyze many apps in one call, one entry per requested name or ID, in
+    request order. Failures are reported per entry instead of failing the
+    whole request.
+
+    All apps run concurrently: their Play Store requests share the
+    process-wide scrape limiter and their reviews go through the shared
+    inference engine, so batches fill up across apps and total time is
+    bound by model throughput rather than the number of apps. Duplicate
+    entries are analyzed once.
+    """
+    runs: Dict[str, asyncio.Task] = {}
+    entries = []
+    for name in app_names:
+        key = _cache_key(name)
+        if key not in runs:
+            runs[key] = asyncio.ensure_future(analyze_app(name))
+        entries.append((runs[key], {"appName": name}))
+    for app_id in app_ids:
+        key = f"id:{app_id.strip()}"
+        if key not in runs:
+            runs[key] = asyncio.ensure_future(analyze_app_id(app_id))
+        entries.append((runs[key], {"appId": app_id}))
+
+    logger.info(f"Bulk analysis of {len(entries)} entries ({len(runs)} distinct apps)")
+    try:
+        results = await asyncio.gather(*(_bulk_entry(task, **ident) for task, ident in entries))
+    finally:
+        for task in runs.values():
+            task.cancel()
+
+    succeeded = sum(1 for entry in results if entry.result is not None)
+    logger.info(f"Bulk analysis finished: {succeeded} succeeded, {len(results) - succeeded} failed")
+    return BulkAnalysisResponse(results=results, succeeded=succeeded, failed=len(results) - succeeded)
+
+
+async def stream_app_analysis(app_name: str) -> AsyncIterator[Tuple[str, AnalysisResponse]]:
+    """
+    Like `analyze_app`, but yields `("progress", partial)` events while
+    pages are fetched and scored, then `("result", final)`. Cache hits
+    yield only the result. The run goes through the same single-flight as
+    `analyze_app`, so concurrent streams and requests for one app share it;
+    a stream joining a run in flight gets its progress from then on.
+    """
+    key = _cache_key(app_name)
+    cached = await _cache.get(key)
+    if cached is not None:
+        value, fresh = cached
+        if not fresh:
+            _schedule_refresh(key, lambda: compute_analysis(app_name), f"appName={app_name}")
+        logger.info(f"Streaming cached result for appName={app_name}")
+        yield "result", AnalysisResponse.model_validate_json(value)
+        return
+
+    app_id = await _resolve_app_id(app_name)
+    if app_id in _analysis_flight:
+        logger.info(f"Streaming in-flight analysis for appName={app_name} (app_id={app_id})")
+
+    # Subscribe before joining, so no partial published by the run is missed
+    updates: asyncio.Queue = asyncio.Queue()
+    subscribers = _progress.setdefault(app_id, set())
+    subscribers.add(updates)
+    run = asyncio.ensure_future(_analysis_flight.do(app_id, lambda: _analyze_app_id(app_id)))
+    try:
+        while not run.done():
+            update = asyncio.ensure_future(updates.get())
+            await asyncio.wait({run, update}, return_when=asyncio.FIRST_COMPLETED)
+            if update.done():
+                yield "progress", update.result()
+            else:
+                update.cancel()
+        response = run.result()
+    finally:
+        # The flight task is shielded: leaving early doesn't stop it for other callers
+        run.cancel()
+        subscribers.discard(updates)
+        if not subscribers and _progress.get(app_id) is subscribers:
+            del _progress[app_id]
+
+    await _cache.set(key, response.model_dump_json())
+    yield "result", response
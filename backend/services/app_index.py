@@ -0,0 +1,106 @@
+import heapq
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+# Sorts after any character a title can contain, to bound a prefix range
+_KEY_END = chr(0x10FFFF)
+
+
+class AppRecord(NamedTuple):
+    app_id: str
+    title: str
+    installs: int
+    score: float
+
+
+def normalize(text: str) -> str:
+    """
+    Lowercase and collapse whitespace, so "  WhatsApp  Messenger" and
+    "whatsapp messenger" share cache and index keys.
+    """
+    return " ".join(text.lower().split())
+
+
+class AppIndex:
+    """
+    In-process prefix index over apps seen in Play Store search results.
+
+    Each title is indexed under every word suffix ("whatsapp messenger"
+    and "messenger"), so a query matches apps where any word starts with
+    it. Keys are kept sorted: a lookup is one bisect plus a scan over all
+    matching keys, so ranking sees every match. Once `max_records` apps are indexed, the least
+    recently seen app is dropped.
+    """
+
+    def __init__(self, max_records: int):
+        self.max_records = max_records
+        self._records: "OrderedDict[str, AppRecord]" = OrderedDict()
+        # Normalized title per app, so ranking doesn't re-normalize
+        self._titles: Dict[str, str] = {}
+        self._keys: List[Tuple[str, str]] = []
+
+    @staticmethod
+    def _index_keys(title: str) -> List[str]:
+        words = title.split()
+        return [" ".join(words[i:]) for i in range(len(words))]
+
+    def _remove(self, app_id: str) -> None:
+        del self._records[app_id]
+        for key in self._index_keys(self._titles.pop(app_id)):
+            i = bisect_left(self._keys, (key, app_id))
+            if i < len(self._keys) and self._keys[i] == (key, app_id):
+                del self._keys[i]
+
+    def add(self, records: Iterable[AppRecord]) -> None:
+        for record in records:
+            if record.app_id in self._records:
+                self._remove(record.app_id)
+            self._records[record.app_id] = record
+            title = self._titles[record.app_id] = normalize(record.title)
+            for key in self._index_keys(title):
+                insort(self._keys, (key, record.app_id))
+        while len(self._records) > self.max_records:
+            self._remove(next(iter(self._records)))
+
+    def get(self, app_id: str) -> Optional[AppRecord]:
+        return self._records.get(app_id)
+
+    def search(self, query: str, limit: int) -> List[AppRecord]:
+        """
+        Indexed apps with a title word starting with `query`: exact title
+        matches first, then titles starting with the query, then by installs.
+        """
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        # Every match is ranked, so a popular app is never cut off by a scan limit
+        start = bisect_left(self._keys, (prefix,))
+        end = bisect_left(self._keys, (prefix + _KEY_END,), start)
+        titles = self._titles
+        exact: Dict[str, None] = {}
+        leading: Dict[str, None] = {}
+        other: Dict[str, None] = {}
+        for key, app_id in self._keys[start:end]:
+            if key != titles[app_id]:
+                other[app_id] = None
+            elif key == prefix:
+                exact[app_id] = None
+            else:
+                leading[app_id] = None
+
+        def installs(app_id: str) -> int:
+            return self._records[app_id].installs
+
+        ranked: List[str] = []
+        for tier in (exact, leading, (a for a in other if a not in exact and a not in leading)):
+            if len(ranked) >= limit:
+                break
+            ranked.extend(heapq.nlargest(limit - len(ranked), tier, key=installs))
+        return [self._records[app_id] for app_id in ranked]
+
+    def __contains__(self, app_id: str) -> bool:
+        return app_id in self._records
+
+    def __len__(self) -> int:
+        return len(self._records)
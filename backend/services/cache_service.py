@@ -0,0 +1,259 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import List, NamedTuple, Optional, Tuple
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class CacheEntry(NamedTuple):
+    value: str
+    stored_at: float  # unix timestamp, comparable across processes
+
+
+class CacheTier(ABC):
+    """
+    A single storage layer of the result cache. Tiers store serialized
+    values and know nothing about freshness; `TieredCache` decides that.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[CacheEntry]:
+        """
+        The entry stored under `key`, or None.
+        """
+
+    @abstractmethod
+    def set(self, key: str, entry: CacheEntry) -> None:
+        """
+        Store `entry` under `key`, replacing any previous entry.
+        """
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """
+        Remove `key` if present.
+        """
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """
+        Number of entries currently stored.
+        """
+
+
+class MemoryLRUCache(CacheTier):
+    """
+    In-process LRU tier bounded by entry count and total value size.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._bytes = 0
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def set(self, key: str, entry: CacheEntry) -> None:
+        size = len(entry.value)
+        if size > self.max_bytes:
+            # Would evict everything else and still not fit
+            self.delete(key)
+            return
+        self.delete(key)
+        self._entries[key] = entry
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted.value)
+            self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry.value)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCache(CacheTier):
+    """
+    On-disk tier that survives restarts and is shared by every worker
+    process pointing at the same file.
+    """
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self.evictions = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " stored_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_stored_at ON cache(stored_at)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, stored_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+        return CacheEntry(*row) if row else None
+
+    def set(self, key: str, entry: CacheEntry) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, stored_at) VALUES (?, ?, ?)",
+                (key, entry.value, entry.stored_at),
+            )
+            # Keep only the newest `max_entries` rows
+            cur = self._conn.execute(
+                "DELETE FROM cache WHERE key IN ("
+                " SELECT key FROM cache ORDER BY stored_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self.evictions += max(cur.rowcount, 0)
+            self._conn.commit()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def purge_older_than(self, cutoff: float) -> int:
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM cache WHERE stored_at < ?", (cutoff,))
+            self._conn.commit()
+        return max(cur.rowcount, 0)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+
+class TieredCache:
+    """
+    Read-through cache: an in-process LRU tier in front of an optional
+    disk tier shared with other workers.
+
+    Entries younger than `ttl` are fresh. Entries older than `ttl` but
+    within `ttl + stale_ttl` are still returned, flagged as stale, so the
+    caller can serve them immediately and refresh in the background.
+    Anything older is treated as a miss and removed.
+    """
+
+    def __init__(self, memory: MemoryLRUCache, disk: Optional[SQLiteCache], ttl: float, stale_ttl: float):
+        self.memory = memory
+        self.disk = disk
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    async def get(self, key: str) -> Optional[Tuple[str, bool]]:
+        """
+        Return `(value, is_fresh)` or None on a miss.
+        """
+        now = time.time()
+        entry = self.memory.get(key)
+        # Another worker may have refreshed the shared tier since we cached it
+        if self.disk is not None and (entry is None or now - entry.stored_at >= self.ttl):
+            try:
+                disk_entry = await asyncio.to_thread(self.disk.get, key)
+            except sqlite3.Error:
+                logger.exception(f"Failed to read cache entry for key={key}")
+                disk_entry = None
+            if disk_entry is not None and (entry is None or disk_entry.stored_at > entry.stored_at):
+                entry = disk_entry
+                self.memory.set(key, entry)
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        age = now - entry.stored_at
+        if age >= self.ttl + self.stale_ttl:
+            self.misses += 1
+            await self.delete(key)
+            return None
+        if age >= self.ttl:
+            self.stale_hits += 1
+            return entry.value, False
+        self.hits += 1
+        return entry.value, True
+
+    async def set(self, key: str, value: str) -> None:
+        entry = CacheEntry(value, time.time())
+        self.memory.set(key, entry)
+        if self.disk is not None:
+            try:
+                await asyncio.to_thread(self.disk.set, key, entry)
+            except sqlite3.Error:
+                # The disk tier is best effort; the memory tier still has the value
+                logger.exception(f"Failed to persist cache entry for key={key}")
+
+    async def delete(self, key: str) -> None:
+        self.memory.delete(key)
+        if self.disk is not None:
+            try:
+                await asyncio.to_thread(self.disk.delete, key)
+            except sqlite3.Error:
+                logger.exception(f"Failed to delete cache entry for key={key}")
+
+    @property
+    def evictions(self) -> int:
+        return self.memory.evictions + (self.disk.evictions if self.disk is not None else 0)
+
+    def __str__(self) -> str:
+        # Lets lazy log calls ("%s", cache) skip building this string
+        return self.info()
+
+    def info(self) -> str:
+        tiers: List[str] = [f"memory={len(self.memory)}/{self.memory.max_entries}"]
+        if self.disk is not None:
+            tiers.append(f"disk={self.disk.path}")
+        return (
+            f"Cache TTL={self.ttl}s (+{self.stale_ttl}s stale), {', '.join(tiers)}, "
+            f"hits={self.hits}, stale_hits={self.stale_hits}, misses={self.misses}, "
+            f"evictions={self.evictions}"
+        )
+
+
+def build_cache() -> TieredCache:
+    """
+    Build the result cache from settings. An empty CACHE_DB_PATH disables
+    the on-disk tier.
+    """
+    memory = MemoryLRUCache(settings.CACHE_MAX_ENTRIES, settings.CACHE_MAX_BYTES)
+    disk = None
+    if settings.CACHE_DB_PATH:
+        try:
+            disk = SQLiteCache(settings.CACHE_DB_PATH, settings.CACHE_DISK_MAX_ENTRIES)
+            disk.purge_older_than(time.time() - settings.CACHE_TTL_SECONDS - settings.CACHE_STALE_TTL_SECONDS)
+        except sqlite3.Error:
+            logger.exception(f"Could not open disk cache at {settings.CACHE_DB_PATH}; using memory only")
+            disk = None
+    return TieredCache(memory, disk, settings.CACHE_TTL_SECONDS, settings.CACHE_STALE_TTL_SECONDS)
@@ -0,0 +1,251 @@
+import inspect
+import logging
+import os
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("torch", "torch-int8", "onnx")
+
+
+class InferenceBackend(ABC):
+    """
+    Turns a batch of texts into signed sentiment scores: the probability of
+    the predicted label, negated when that label is NEGATIVE.
+
+    Subclasses only provide `_logits`; tokenization and post-processing
+    are shared so every backend scores text the same way.
+    """
+
+    name = "base"
+
+    def __init__(self, tokenizer, id2label: Dict[int, str], max_length: int = 512):
+        self.tokenizer = tokenizer
+        self.max_length = max_length
+        self._positive = [str(id2label[i]).upper() == "POSITIVE" for i in sorted(id2label)]
+
+    @abstractmethod
+    def _logits(self, encoded: Dict[str, Any]):
+        """
+        Raw logits of shape (batch, labels) for tokenized numpy inputs.
+        """
+
+    def _scores(self, logits) -> List[float]:
+        logits = np.asarray(logits, dtype=np.float64)
+        logits -= logits.max(axis=-1, keepdims=True)
+        probs = np.exp(logits)
+        probs /= probs.sum(axis=-1, keepdims=True)
+        labels = probs.argmax(axis=-1)
+        return [
+            float(probs[i, label]) if self._positive[label] else -float(probs[i, label])
+            for i, label in enumerate(labels)
+        ]
+
+    def predict(self, texts: Sequence[str]) -> List[float]:
+        if not texts:
+            return []
+        encoded = self.tokenizer(
+            list(texts),
+            padding=True,
+            truncation=True,
+            max_length=self.max_length,
+            return_tensors="np",
+        )
+        return self._scores(self._logits(encoded))
+
+    def predict_encoded(self, batch: Sequence[Sequence[int]]) -> List[float]:
+        """
+        Score already tokenized inputs (token ids including special tokens),
+        padded only to the longest sequence in `batch`.
+        """
+        if not batch:
+            return []
+        width = max(len(ids) for ids in batch)
+        pad_id = self.tokenizer.pad_token_id or 0
+        input_ids = np.full((len(batch), width), pad_id, dtype=np.int64)
+        attention_mask = np.zeros((len(batch), width), dtype=np.int64)
+        for row, ids in enumerate(batch):
+            input_ids[row, :len(ids)] = ids
+            attention_mask[row, :len(ids)] = 1
+        return self._scores(self._logits({"input_ids": input_ids, "attention_mask": attention_mask}))
+
+
+class TorchBackend(InferenceBackend):
+    """
+    Stock PyTorch eager inference.
+    """
+
+    name = "torch"
+
+    def __init__(self, tokenizer, model, max_length: int = 512):
+        super().__init__(tokenizer, model.config.id2label, max_length)
+        import torch
+
+        if settings.INFERENCE_INTRA_OP_THREADS > 0:
+            torch.set_num_threads(settings.INFERENCE_INTRA_OP_THREADS)
+        self.model = model.eval()
+
+    def _logits(self, encoded: Dict[str, Any]):
+        import torch
+
+        inputs = {
+            key: torch.from_numpy(encoded[key])
+            for key in ("input_ids", "attention_mask")
+        }
+        with torch.inference_mode():
+            return self.model(**inputs).logits.float().numpy()
+
+
+class QuantizedTorchBackend(TorchBackend):
+    """
+    PyTorch with dynamic int8 quantization of every Linear layer: weights
+    are stored as int8 and activations are quantized on the fly. Roughly
+    halves CPU latency for DistilBERT at a small accuracy cost.
+    """
+
+    name = "torch-int8"
+
+    def __init__(self, tokenizer, model, max_length: int = 512):
+        import torch
+
+        quantized = torch.ao.quantization.quantize_dynamic(
+            model.eval(), {torch.nn.Linear}, dtype=torch.qint8
+        )
+        super().__init__(tokenizer, quantized, max_length)
+
+
+class OnnxBackend(InferenceBackend):
+    """
+    ONNX Runtime session over the model exported to `onnx_path`. The model
+    is exported once on first use and reused on later starts.
+    """
+
+    name = "onnx"
+
+    def __init__(self, tokenizer, model, onnx_path: str, max_length: int = 512):
+        super().__init__(tokenizer, model.config.id2label, max_length)
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise RuntimeError(
+                "INFERENCE_BACKEND=onnx requires the onnxruntime package (pip install onnxruntime onnx)"
+            ) from e
+
+        if not os.path.exists(onnx_path):
+            export_onnx(model, tokenizer, onnx_path)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if settings.INFERENCE_INTRA_OP_THREADS > 0:
+            options.intra_op_num_threads = settings.INFERENCE_INTRA_OP_THREADS
+        options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+        self._input_names = {i.name for i in self.session.get_inputs()}
+
+    def _logits(self, encoded: Dict[str, Any]):
+        feeds = {
+            key: encoded[key].astype("int64")
+            for key in ("input_ids", "attention_mask")
+            if key in self._input_names
+        }
+        return self.session.run(None, feeds)[0]
+
+
+def export_onnx(model, tokenizer, onnx_path: str) -> None:
+    """
+    Export a sequence-classification model to ONNX with dynamic batch and
+    sequence axes.
+    """
+    import torch
+
+    class _LogitsOnly(torch.nn.Module):
+        def __init__(self, inner):
+            super().__init__()
+            self.inner = inner
+
+        def forward(self, input_ids, attention_mask):
+            return self.inner(input_ids=input_ids, attention_mask=attention_mask).logits
+
+    directory = os.path.dirname(onnx_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    logger.info(f"Exporting sentiment model to ONNX at {onnx_path}")
+    sample = tokenizer(["export sample", "a second, longer export sample"], padding=True, return_tensors="pt")
+    # The exporter restores the wrapper's training mode afterwards, so it must start in eval
+    wrapper = _LogitsOnly(model).eval()
+    tmp_path = f"{onnx_path}.tmp-{os.getpid()}"
+    options: Dict[str, Any] = {}
+    # Newer torch defaults to the dynamo exporter; `dynamo` only exists from torch 2.5
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        options["dynamo"] = False
+    torch.onnx.export(
+        wrapper,
+        (sample["input_ids"], sample["attention_mask"]),
+        tmp_path,
+        input_names=["input_ids", "attention_mask"],
+        output_names=["logits"],
+        dynamic_axes={
+            "input_ids": {0: "batch", 1: "sequence"},
+            "attention_mask": {0: "batch", 1: "sequence"},
+            "logits": {0: "batch"},
+        },
+        opset_version=17,
+        **options,
+    )
+    # Atomic rename so concurrently starting workers never load a partial file
+    os.replace(tmp_path, onnx_path)
+
+
+def build_backend(name: str, tokenizer, model, onnx_path: str) -> InferenceBackend:
+    """
+    Build the inference backend selected by `name` (one of BACKENDS).
+    """
+    if name == "torch":
+        return TorchBackend(tokenizer, model)
+    if name == "torch-int8":
+        return QuantizedTorchBackend(tokenizer, model)
+    if name == "onnx":
+        return OnnxBackend(tokenizer, model, onnx_path)
+    raise ValueError(f"Unknown INFERENCE_BACKEND '{name}'; expected one of {', '.join(BACKENDS)}")
+
+
+def check_parity(
+    candidate: InferenceBackend,
+    baseline: InferenceBackend,
+    texts: Sequence[str],
+    tolerance: float,
+    batch_size: int = 32,
+) -> Dict[str, Any]:
+    """
+    Compare the mean sentiment score of `candidate` against `baseline` on
+    the same texts. `ok` is False when the means differ by more than
+    `tolerance`.
+    """
+    def _score(backend: InferenceBackend) -> List[float]:
+        scores: List[float] = []
+        for i in range(0, len(texts), batch_size):
+            scores.extend(backend.predict(texts[i:i + batch_size]))
+        return scores
+
+    base_scores = _score(baseline)
+    cand_scores = _score(candidate)
+    n = max(len(texts), 1)
+    base_mean = sum(base_scores) / n
+    cand_mean = sum(cand_scores) / n
+    return {
+        "baseline": baseline.name,
+        "candidate": candidate.name,
+        "texts": len(texts),
+        "baseline_mean": base_mean,
+        "candidate_mean": cand_mean,
+        "mean_abs_diff": abs(cand_mean - base_mean),
+        "max_abs_diff": max((abs(a - b) for a, b in zip(base_scores, cand_scores)), default=0.0),
+        "label_flips": sum((a >= 0) != (b >= 0) for a, b in zip(base_scores, cand_scores)),
+        "tolerance": tolerance,
+        "ok": abs(cand_mean - base_mean) <= tolerance,
+    }
@@ -0,0 +1,177 @@
+import asyncio
+import logging
+import time
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+from services.metrics import ENGINE_BATCHES, INFERENCE_BATCH_SIZE, STAGE_SECONDS, span
+
+logger = logging.getLogger(__name__)
+
+
+class BatchInferenceEngine:
+    """
+    Dynamic micro-batching front end for a blocking batch model call.
+
+    Callers submit single items from any coroutine; a background collector
+    groups whatever is pending into batches of at most `max_batch_size`,
+    waiting no longer than `max_wait_ms` after the first item of a batch
+    arrives, runs `infer_fn` once per batch in a worker thread and resolves
+    each caller's future with its own result. Up to `max_concurrency`
+    batches run at once, which only helps when `infer_fn` hands work to
+    something with its own parallelism, such as an inference process pool.
+    """
+
+    def __init__(
+        self,
+        infer_fn: Callable[[List[Any]], Sequence[Any]],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 10.0,
+        max_concurrency: int = 1,
+    ):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self._infer_fn = infer_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max(max_wait_ms, 0.0) / 1000.0
+        self.max_concurrency = max(max_concurrency, 1)
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _ensure_started(self) -> asyncio.Queue:
+        """
+        Start the collector on the running loop (lazily, and again if the
+        loop changed, e.g. across test runs or app restarts).
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+        return self._queue
+
+    async def submit(self, item: Any) -> Any:
+        """
+        Queue a single item for inference and wait for its result.
+        """
+        queue = self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        queue.put_nowait((item, future, time.perf_counter()))
+        return await future
+
+    async def submit_many(self, items: Sequence[Any]) -> List[Any]:
+        """
+        Queue several items at once; results are returned in input order.
+        """
+        queue = self._ensure_started()
+        loop = asyncio.get_running_loop()
+        futures = []
+        enqueued_at = time.perf_counter()
+        for item in items:
+            future = loop.create_future()
+            queue.put_nowait((item, future, enqueued_at))
+            futures.append(future)
+        return list(await asyncio.gather(*futures))
+
+    @property
+    def pending(self) -> int:
+        """
+        Items queued and not yet picked up by a batch.
+        """
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def _collect(self, queue: asyncio.Queue) -> List[Tuple[Any, asyncio.Future, float]]:
+        """
+        Block for the first pending item, then keep draining the queue until
+        the batch is full or the wait window after the first item closes.
+        """
+        batch = [await queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        queue = self._queue
+        slots = asyncio.Semaphore(self.max_concurrency)
+        running = set()
+        try:
+            while True:
+                # Only start collecting once a batch slot is free, so items
+                # keep accumulating into the next batch meanwhile
+                await slots.acquire()
+                try:
+                    batch = await self._collect(queue)
+                except BaseException:
+                    slots.release()
+                    raise
+                task = asyncio.create_task(self._run_batch(batch))
+                running.add(task)
+                task.add_done_callback(running.discard)
+                task.add_done_callback(lambda _: slots.release())
+        finally:
+            for task in running:
+                task.cancel()
+
+    async def _run_batch(self, batch: List[Tuple[Any, asyncio.Future, float]]) -> None:
+        # Callers that were cancelled while queued don't need a forward pass
+        batch = [(item, fut, enqueued_at) for item, fut, enqueued_at in batch if not fut.done()]
+        if not batch:
+            return
+        started = time.perf_counter()
+        queue_wait = STAGE_SECONDS.labels("queue_wait")
+        for _, _, enqueued_at in batch:
+            queue_wait.observe(started - enqueued_at)
+        items = [item for item, _, _ in batch]
+        INFERENCE_BATCH_SIZE.observe(len(items))
+        try:
+            with span("inference", batch_size=len(items)):
+                results = await asyncio.to_thread(self._infer_fn, items)
+            if len(results) != len(items):
+                raise RuntimeError(
+                    f"Inference returned {len(results)} results for {len(items)} inputs"
+                )
+        except asyncio.CancelledError:
+            ENGINE_BATCHES.labels("cancelled").inc()
+            for _, fut, _ in batch:
+                fut.cancel()
+            raise
+        except Exception as e:
+            ENGINE_BATCHES.labels("failed").inc()
+            logger.exception(f"Batch inference failed for {len(items)} items")
+            for _, fut, _ in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        ENGINE_BATCHES.labels("ok").inc()
+        for (_, fut, _), result in zip(batch, results):
+            if not fut.done():
+                fut.set_result(result)
+
+    async def close(self) -> None:
+        """
+        Stop the collector task; pending callers receive CancelledError.
+        """
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        if self._queue is not None:
+            while not self._queue.empty():
+                _, fut, _ = self._queue.get_nowait()
+                fut.cancel()
@@ -0,0 +1,497 @@
+"""
+Out-of-process inference workers.
+
+`InferencePool` runs N worker processes, each holding one inference backend
+with a pinned thread count, fed batches of token ids through a shared request queue.
+Batches go out and scores come back over multiprocessing queues, so the API
+process only tokenizes and never loads or runs the model itself.
+
+To share one pool between several uvicorn workers (and scale it
+independently of them), run it standalone:
+
+    INFERENCE_POOL_AUTHKEY=<secret> python -m services.inference_pool --host 127.0.0.1 --port 8765 --workers 4
+
+and point the API at it with INFERENCE_POOL_ADDRESS=127.0.0.1:8765 and the
+same INFERENCE_POOL_AUTHKEY. The pool unpickles what authenticated clients
+send, so the key is required and must be kept secret.
+"""
+import argparse
+import itertools
+import logging
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from multiprocessing.connection import Client, Listener
+from typing import Any, Deque, Dict, List, Optional, Sequence, Set, Tuple, Union
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+_AUTHKEY_MISSING = (
+    "INFERENCE_POOL_AUTHKEY must be set to a secret shared by the standalone "
+    "inference pool and its clients"
+)
+
+
+def _worker_main(index: int, threads: int, requests: "mp.Queue", responses: "mp.Queue") -> None:
+    """
+    Entry point of a worker process: load one backend, then score batches
+    from its `requests` queue until a None sentinel arrives. Every message
+    back is `(tag, index, scores, error)`, where tag is "ready", "failed" or
+    the request id.
+    """
+    # Pin math library threads before torch/onnxruntime are imported
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    settings.INFERENCE_INTRA_OP_THREADS = threads
+
+    from services import model_registry
+
+    try:
+        backend = model_registry.get_model()
+        backend.predict(["warm up"])
+    except Exception as e:
+        responses.put(("failed", index, None, repr(e)))
+        return
+    responses.put(("ready", index, None, None))
+
+    while True:
+        message = requests.get()
+        if message is None:
+            break
+        request_id, batch = message
+        try:
+            responses.put((request_id, index, backend.predict_encoded(batch), None))
+        except Exception as e:
+            responses.put((request_id, index, None, repr(e)))
+
+
+class InferencePool:
+    """
+    N local worker processes. Each worker has its own request queue and is
+    handed one batch at a time, so the pool knows which batch a worker holds
+    and can fail it immediately if the worker dies. Workers that crash are
+    restarted; a worker that can't load the model is left out, and the
+    pool keeps serving from the others. `predict` is blocking and
+    thread-safe, so it can be called from `asyncio.to_thread`.
+    """
+
+    def __init__(self, workers: int, threads: int, timeout: float):
+        self.workers = workers
+        self.threads = threads
+        self.timeout = timeout
+        self._ctx = mp.get_context("spawn")
+        self._responses = self._ctx.Queue()
+        self._processes: List[Any] = []
+        self._queues: List[Any] = []
+        # Request id each worker is currently scoring, if any
+        self._holding: List[Optional[int]] = []
+        # Request id -> (future, monotonic deadline, batch)
+        self._pending: Dict[int, Tuple[Future, float, List[List[int]]]] = {}
+        # Request ids waiting for an idle worker
+        self._backlog: Deque[int] = deque()
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._ready = set()
+        # Workers that could not load the model (or be respawned); never restarted or dispatched to
+        self._failed: Set[int] = set()
+        self._ready_event = threading.Event()
+        self._error: Optional[str] = None
+        self._reader: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._closed = False
+
+    def _spawn(self, index: int):
+        # A fresh queue per process: a worker killed mid-read can leave its queue unusable
+        requests = self._ctx.Queue()
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(index, self.threads, requests, self._responses),
+            name=f"inference-worker-{index}",
+            daemon=True,
+        )
+        process.start()
+        return process, requests
+
+    def start(self, wait: bool = True) -> None:
+        """
+        Spawn the workers (once) and optionally block until all have loaded
+        the model.
+        """
+        with self._start_lock:
+            if self._reader is None:
+                logger.info(f"Starting inference pool with {self.workers} workers x {self.threads} threads")
+                with self._lock:
+                    for i in range(self.workers):
+                        process, requests = self._spawn(i)
+                        self._processes.append(process)
+                        self._queues.append(requests)
+                        self._holding.append(None)
+                self._reader = threading.Thread(target=self._read_responses, name="inference-pool-reader", daemon=True)
+                self._reader.start()
+        if wait:
+            self._ready_event.wait(self.timeout)
+
+    @property
+    def ready(self) -> bool:
+        """
+        Whether every worker that could load the model has done so, and at
+        least one did.
+        """
+        return bool(self._ready) and len(self._ready) + len(self._failed) == self.workers
+
+    @property
+    def error(self) -> Optional[str]:
+        return self._error
+
+    def _read_responses(self) -> None:
+        while not self._closed:
+            try:
+                tag, index, scores, error = self._responses.get(timeout=0.2)
+            except queue.Empty:
+                tag = None
+            except (EOFError, OSError):
+                break
+
+            if tag == "ready":
+                self._ready.add(index)
+                self._update_ready()
+            elif tag == "failed":
+                logger.error(f"Inference worker {index} failed to load model: {error}")
+                self._mark_failed(index, error)
+            elif tag is not None:
+                self._complete(index, tag, scores, error)
+
+            # Checked on every message, not only when idle, so a crash is noticed while others reply
+            self._check_workers()
+            self._expire()
+            with self._lock:
+                self._dispatch_locked()
+
+    def _complete(self, index: int, request_id: int, scores: Optional[List[float]], error: Optional[str]) -> None:
+        with self._lock:
+            if self._holding[index] == request_id:
+                self._holding[index] = None
+            entry = self._pending.pop(request_id, None)
+        if entry is None or entry[0].done():
+            return
+        if error is not None:
+            entry[0].set_exception(RuntimeError(f"Inference worker error: {error}"))
+        else:
+            entry[0].set_result(scores)
+
+    def _update_ready(self) -> None:
+        # Also released when every worker failed, so `start` doesn't wait out the timeout
+        if len(self._ready) + len(self._failed) == self.workers:
+            self._ready_event.set()
+
+    def _mark_failed(self, index: int, error: str) -> None:
+        with self._lock:
+            self._error = error
+            self._failed.add(index)
+            self._ready.discard(index)
+            # The batch never started, so another worker can take it
+            request_id, self._holding[index] = self._holding[index], None
+            if request_id is not None and request_id in self._pending:
+                self._backlog.appendleft(request_id)
+            exhausted = len(self._failed) == self.workers
+        self._update_ready()
+        if exhausted:
+            self._fail_pending(RuntimeError(f"No inference workers available: {error}"))
+
+    def _check_workers(self) -> None:
+        lost: List[Future] = []
+        unrecoverable: List[Tuple[int, str]] = []
+        with self._lock:
+            for index, process in enumerate(self._processes):
+                if self._closed or index in self._failed or process.is_alive():
+                    continue
+                request_id, self._holding[index] = self._holding[index], None
+                if request_id is not None and request_id in self._pending:
+                    lost.append(self._pending.pop(request_id)[0])
+                self._ready.discard(index)
+                logger.error(f"Inference worker {index} exited with code {process.exitcode}; restarting")
+                try:
+                    self._processes[index], self._queues[index] = self._spawn(index)
+                except Exception as e:
+                    logger.exception(f"Could not restart inference worker {index}")
+                    unrecoverable.append((index, repr(e)))
+        for index, error in unrecoverable:
+            self._mark_failed(index, error)
+        for future in lost:
+            if not future.done():
+                future.set_exception(RuntimeError("Inference worker exited while scoring this batch"))
+
+    def _expire(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            expired = [rid for rid, (_, deadline, _) in self._pending.items() if deadline <= now]
+            futures = [self._pending.pop(rid)[0] for rid in expired]
+        for future in futures:
+            if not future.done():
+                future.set_exception(TimeoutError(f"Inference batch timed out after {self.timeout}s"))
+
+    def _fail_pending(self, error: Exception) -> None:
+        with self._lock:
+            futures = [future for future, _, _ in self._pending.values()]
+            self._pending.clear()
+            self._backlog.clear()
+        for future in futures:
+            if not future.done():
+                future.set_exception(error)
+
+    def _dispatch_locked(self) -> None:
+        """
+        Hand backlog requests to idle, live workers. Caller holds `_lock`.
+        """
+        for index, held in enumerate(self._holding):
+            if not self._backlog:
+                return
+            if held is not None or index in self._failed or not self._processes[index].is_alive():
+                continue
+            while self._backlog:
+                request_id = self._backlog.popleft()
+                # Skip requests that already timed out or were cancelled
+                if request_id in self._pending:
+                    self._queues[index].put((request_id, self._pending[request_id][2]))
+                    self._holding[index] = request_id
+                    break
+
+    def _submit(self, batch: Sequence[Sequence[int]]) -> Tuple[int, Future]:
+        if self._reader is None:
+            self.start(wait=False)
+        future: Future = Future()
+        request_id = next(self._ids)
+        with self._lock:
+            if len(self._failed) == self.workers:
+                future.set_exception(RuntimeError(f"No inference workers available: {self._error}"))
+                return request_id, future
+            self._pending[request_id] = (future, time.monotonic() + self.timeout, [list(ids) for ids in batch])
+            self._backlog.append(request_id)
+            self._dispatch_locked()
+        return request_id, future
+
+    def submit(self, batch: Sequence[Sequence[int]]) -> Future:
+        """
+        Queue a batch; the future fails if its worker dies or it is not
+        scored within the pool timeout.
+        """
+        return self._submit(batch)[1]
+
+    def predict(self, batch: Sequence[Sequence[int]]) -> List[float]:
+        request_id, future = self._submit(batch)
+        try:
+            return future.result(timeout=self.timeout)
+        finally:
+            if not future.done():
+                future.cancel()
+                with self._lock:
+                    self._pending.pop(request_id, None)
+
+    def close(self) -> None:
+        self._closed = True
+        for requests in self._queues:
+            requests.put(None)
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        with self._lock:
+            futures = [future for future, _, _ in self._pending.values()]
+            self._pending.clear()
+            self._backlog.clear()
+        for future in futures:
+            future.cancel()
+
+
+class RemoteInferencePool:
+    """
+    Client for a standalone pool started with `python -m services.inference_pool`.
+    Same `predict` interface as `InferencePool`; one connection per API process.
+    """
+
+    def __init__(self, address: Tuple[str, int], authkey: bytes, timeout: float):
+        self.address = address
+        self.authkey = authkey
+        self.timeout = timeout
+        self._conn = None
+        self._send_lock = threading.Lock()
+        self._pending: Dict[int, Future] = {}
+        self._pending_lock = threading.Lock()
+        self._ids = itertools.count()
+        self._error: Optional[str] = None
+
+    def start(self, wait: bool = True) -> None:
+        self._connect()
+
+    @property
+    def ready(self) -> bool:
+        return self._conn is not None
+
+    @property
+    def error(self) -> Optional[str]:
+        return self._error
+
+    def _connect(self):
+        if not self.authkey:
+            self._error = _AUTHKEY_MISSING
+            raise RuntimeError(_AUTHKEY_MISSING)
+        with self._send_lock:
+            if self._conn is None:
+                try:
+                    self._conn = Client(self.address, authkey=self.authkey)
+                except OSError as e:
+                    self._error = repr(e)
+                    raise
+                self._error = None
+                threading.Thread(target=self._read_responses, args=(self._conn,), daemon=True).start()
+            return self._conn
+
+    def _read_responses(self, conn) -> None:
+        try:
+            while True:
+                request_id, scores, error = conn.recv()
+                with self._pending_lock:
+                    future = self._pending.pop(request_id, None)
+                if future is None or future.done():
+                    continue
+                if error is not None:
+                    future.set_exception(RuntimeError(f"Inference worker error: {error}"))
+                else:
+                    future.set_result(scores)
+        except (EOFError, OSError) as e:
+            logger.error(f"Lost connection to inference pool at {self.address}: {e!r}")
+            with self._send_lock:
+                if self._conn is conn:
+                    self._conn = None
+            with self._pending_lock:
+                pending, self._pending = self._pending, {}
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("Inference pool connection lost"))
+
+    def predict(self, batch: Sequence[Sequence[int]]) -> List[float]:
+        conn = self._connect()
+        future: Future = Future()
+        request_id = next(self._ids)
+        with self._pending_lock:
+            self._pending[request_id] = future
+        with self._send_lock:
+            conn.send((request_id, [list(ids) for ids in batch]))
+        try:
+            return future.result(timeout=self.timeout)
+        finally:
+            with self._pending_lock:
+                self._pending.pop(request_id, None)
+
+    def close(self) -> None:
+        with self._send_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def _parse_address(address: str) -> Tuple[str, int]:
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+_pool: Optional[Union[InferencePool, RemoteInferencePool]] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> Optional[Union[InferencePool, RemoteInferencePool]]:
+    """
+    The process-wide pool, or None when inference runs in-process
+    (neither INFERENCE_POOL_WORKERS nor INFERENCE_POOL_ADDRESS set).
+    """
+    global _pool
+    if _pool is None and (settings.INFERENCE_POOL_ADDRESS or settings.INFERENCE_POOL_WORKERS > 0):
+        with _pool_lock:
+            if _pool is None:
+                if settings.INFERENCE_POOL_ADDRESS:
+                    _pool = RemoteInferencePool(
+                        _parse_address(settings.INFERENCE_POOL_ADDRESS),
+                        settings.INFERENCE_POOL_AUTHKEY.encode(),
+                        settings.INFERENCE_POOL_TIMEOUT,
+                    )
+                else:
+                    _pool = InferencePool(
+                        settings.INFERENCE_POOL_WORKERS,
+                        settings.INFERENCE_POOL_THREADS,
+                        settings.INFERENCE_POOL_TIMEOUT,
+                    )
+    return _pool
+
+
+def close_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+def _serve_connection(conn, pool: InferencePool) -> None:
+    send_lock = threading.Lock()
+
+    def _reply(request_id: int, future: Future) -> None:
+        if future.cancelled():
+            message = (request_id, None, "cancelled")
+        elif future.exception() is not None:
+            message = (request_id, None, repr(future.exception()))
+        else:
+            message = (request_id, future.result(), None)
+        try:
+            with send_lock:
+                conn.send(message)
+        except (EOFError, OSError):
+            pass
+
+    try:
+        while True:
+            request_id, batch = conn.recv()
+            # Resolves with the scores, a worker error, or a timeout after INFERENCE_POOL_TIMEOUT
+            future = pool.submit(batch)
+            future.add_done_callback(lambda f, rid=request_id: _reply(rid, f))
+    except (EOFError, OSError):
+        conn.close()
+
+
+def serve(host: str, port: int, workers: int, threads: int) -> None:
+    """
+    Run a standalone pool that API processes connect to over TCP.
+    """
+    if not settings.INFERENCE_POOL_AUTHKEY:
+        raise SystemExit(_AUTHKEY_MISSING)
+    pool = InferencePool(workers, threads, settings.INFERENCE_POOL_TIMEOUT)
+    pool.start()
+    if not pool.ready:
+        raise SystemExit(f"Inference workers did not become ready: {pool.error}")
+    with Listener((host, port), authkey=settings.INFERENCE_POOL_AUTHKEY.encode()) as listener:
+        logger.info(f"Inference pool listening on {host}:{port}")
+        try:
+            while True:
+                conn = listener.accept()
+                threading.Thread(target=_serve_connection, args=(conn, pool), daemon=True).start()
+        finally:
+            pool.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    )
+    parser = argparse.ArgumentParser(description="Standalone sentiment inference pool")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=max(settings.INFERENCE_POOL_WORKERS, 1))
+    parser.add_argument("--threads", type=int, default=settings.INFERENCE_POOL_THREADS)
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers, args.threads)
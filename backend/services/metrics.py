@@ -0,0 +1,153 @@
+"""
+Prometheus metrics and per-stage timing spans for the analyze path.
+
+Stage durations, batch sizes, queue and limiter waits and in-flight
+requests are recorded as they happen. Cache, request-coalescing and index
+counters already kept by the services are read when /metrics is scraped,
+so the hot path doesn't count anything twice. Metrics are per process.
+"""
+import logging
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.registry import Collector
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("resolve_app_id", "fetch_page", "queue_wait", "inference", "aggregation")
+
+STAGE_SECONDS = Histogram(
+    "analyzer_stage_duration_seconds",
+    "Time spent per stage of the analyze path",
+    ["stage"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+INFERENCE_BATCH_SIZE = Histogram(
+    "analyzer_inference_batch_size",
+    "Number of texts per inference batch",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+LIMITER_WAIT_SECONDS = Histogram(
+    "analyzer_limiter_wait_seconds",
+    "Time spent waiting for a concurrency limiter slot",
+    ["limiter"],
+    buckets=(0.0001, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0),
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "analyzer_http_requests_in_flight",
+    "Requests currently being handled, per endpoint",
+    ["endpoint"],
+)
+ENGINE_BATCHES = Counter(
+    "analyzer_inference_batches_total",
+    "Inference batches run, by outcome",
+    ["outcome"],
+)
+
+# Pre-create label sets so every stage shows up before its first observation
+for _stage in STAGES:
+    STAGE_SECONDS.labels(_stage)
+
+
+@contextmanager
+def span(stage: str, **attrs: Any) -> Iterator[None]:
+    """
+    Time a stage: the duration is recorded in the stage histogram and,
+    when debug logging is enabled, logged with `attrs`.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.labels(stage).observe(elapsed)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "span stage=%s duration_ms=%.2f %s",
+                stage,
+                elapsed * 1000,
+                " ".join(f"{k}={v}" for k, v in attrs.items()),
+                extra={"span": {"stage": stage, "duration_ms": elapsed * 1000, **attrs}},
+            )
+
+
+class _ServiceStatsCollector(Collector):
+    """
+    Exposes the counters kept by the cache, single-flight, search index and
+    tokenizer cache objects at scrape time.
+    """
+
+    @staticmethod
+    def _families():
+        return (
+            CounterMetricFamily(
+                "analyzer_cache_requests", "Cache lookups by cache and result", labels=["cache", "result"]
+            ),
+            CounterMetricFamily(
+                "analyzer_cache_evictions", "Entries evicted to stay within cache bounds", labels=["cache"]
+            ),
+            GaugeMetricFamily("analyzer_cache_entries", "Entries currently cached", labels=["cache"]),
+            CounterMetricFamily(
+                "analyzer_single_flight_calls", "Calls that ran or joined an in-flight run", labels=["flight", "outcome"]
+            ),
+            GaugeMetricFamily("analyzer_single_flight_in_flight", "Runs currently in flight", labels=["flight"]),
+            GaugeMetricFamily("analyzer_inference_queue_depth", "Texts waiting for an inference batch"),
+        )
+
+    def describe(self):
+        # Lets the registry learn the metric names without calling collect() at import time
+        return self._families()
+
+    def collect(self):
+        # Imported here: these modules import this one for spans
+        from services import analysis_service, play_store_service, sentiment_service
+
+        requests, evictions, entries, coalescing, in_flight, queue = self._families()
+
+        stats = analysis_service.stats()
+        cache = stats["cache"]
+        for key, result in (("hits", "hit"), ("stale_hits", "stale_hit"), ("misses", "miss")):
+            requests.add_metric(["result", result], cache[key])
+        evictions.add_metric(["result"], cache["evictions"])
+        entries.add_metric(["result"], cache["memory_entries"])
+
+        search = stats["search"]
+        requests.add_metric(["app_id", "hit"], search["resolve_hits"])
+        requests.add_metric(["app_id", "miss"], search["resolve_misses"])
+        requests.add_metric(["search_query", "hit"], search["query_hits"])
+        requests.add_metric(["app_index", "hit"], search["index_hits"])
+        requests.add_metric(["app_index", "miss"], search["index_misses"])
+        for name, value in play_store_service.cache_evictions().items():
+            evictions.add_metric([name], value)
+        entries.add_metric(["app_id"], search["cached_resolutions"])
+        entries.add_metric(["search_query"], search["cached_queries"])
+        entries.add_metric(["app_index"], search["indexed_apps"])
+
+        tokens = sentiment_service.token_cache_stats()
+        if tokens is not None:
+            requests.add_metric(["tokens", "hit"], tokens["hits"])
+            requests.add_metric(["tokens", "miss"], tokens["misses"])
+            evictions.add_metric(["tokens"], tokens["evictions"])
+            entries.add_metric(["tokens"], tokens["entries"])
+
+        for flight, flight_stats in (("analysis", stats["single_flight"]), ("search", search["single_flight"])):
+            coalescing.add_metric([flight, "executed"], flight_stats["executions"])
+            coalescing.add_metric([flight, "coalesced"], flight_stats["coalesced"])
+            in_flight.add_metric([flight], flight_stats["in_flight"])
+
+        queue.add_metric([], sentiment_service.queue_depth())
+
+        yield from (requests, evictions, entries, coalescing, in_flight, queue)
+
+
+REGISTRY.register(_ServiceStatsCollector())
+
+
+def render() -> tuple:
+    """
+    The current metrics in Prometheus text format, with its content type.
+    """
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
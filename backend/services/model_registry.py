@@ -0,0 +1,155 @@
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import threading
+from typing import Any, Dict, Optional
+
+from config import settings
+from services.inference_backends import build_backend
+
+logger = logging.getLogger(__name__)
+
+# One inference backend per process, loaded on first use or by `warm_up`
+_model: Optional[Any] = None
+_tokenizer: Optional[Any] = None
+_load_error: Optional[str] = None
+_lock = threading.Lock()
+
+
+def model_source() -> str:
+    """
+    Where the model is loaded from: a local directory if configured,
+    otherwise the pinned Hub model name.
+    """
+    return settings.SENTIMENT_MODEL_PATH or settings.SENTIMENT_MODEL_NAME
+
+
+def model_version() -> str:
+    """
+    Identifier of the configured model and backend, known without loading
+    it. Quantized and exported backends score slightly differently, so
+    stored scores are only reused for the same version.
+    """
+    if settings.SENTIMENT_MODEL_PATH:
+        version = f"{settings.SENTIMENT_MODEL_NAME}@local"
+    else:
+        version = f"{settings.SENTIMENT_MODEL_NAME}@{settings.SENTIMENT_MODEL_REVISION}"
+    if settings.INFERENCE_BACKEND != "torch":
+        version = f"{version}+{settings.INFERENCE_BACKEND}"
+    # Truncation changes the scores of long reviews
+    return f"{version}/{settings.INFERENCE_TRUNCATION}{settings.INFERENCE_MAX_TOKENS}"
+
+
+def onnx_path() -> str:
+    """
+    Where the ONNX export lives; defaults to a file under data/onnx named
+    after the model and revision (or local model directory).
+    """
+    if settings.ONNX_MODEL_PATH:
+        return settings.ONNX_MODEL_PATH
+    # The export is reused whenever the file exists, so the name must pin the exact source model
+    if settings.SENTIMENT_MODEL_PATH:
+        source = os.path.abspath(settings.SENTIMENT_MODEL_PATH)
+        base = f"{settings.SENTIMENT_MODEL_NAME}@local-{hashlib.sha1(source.encode()).hexdigest()[:10]}"
+    else:
+        base = f"{settings.SENTIMENT_MODEL_NAME}@{settings.SENTIMENT_MODEL_REVISION}"
+    return os.path.join("data", "onnx", re.sub(r"[^A-Za-z0-9_.-]+", "_", base) + ".onnx")
+
+
+def _from_pretrained_kwargs() -> Dict[str, Any]:
+    local_only = settings.MODEL_OFFLINE or bool(settings.SENTIMENT_MODEL_PATH)
+    kwargs: Dict[str, Any] = {"local_files_only": local_only}
+    if not settings.SENTIMENT_MODEL_PATH:
+        kwargs["revision"] = settings.SENTIMENT_MODEL_REVISION
+    return kwargs
+
+
+def load_tokenizer():
+    # Imported here so importing the app does not pay for transformers/torch
+    from transformers import AutoTokenizer
+
+    return AutoTokenizer.from_pretrained(model_source(), **_from_pretrained_kwargs())
+
+
+def load_model():
+    """
+    Load the configured tokenizer and PyTorch model (no backend applied).
+    """
+    from transformers import AutoModelForSequenceClassification
+
+    source = model_source()
+    kwargs = _from_pretrained_kwargs()
+    logger.info(f"Loading sentiment model from {source} (local_files_only={kwargs['local_files_only']})")
+    tokenizer = load_tokenizer()
+    model = AutoModelForSequenceClassification.from_pretrained(source, **kwargs)
+    model.eval()
+    return tokenizer, model
+
+
+def _load():
+    tokenizer, model = load_model()
+    logger.info(f"Building {settings.INFERENCE_BACKEND} inference backend")
+    return build_backend(settings.INFERENCE_BACKEND, tokenizer, model, onnx_path())
+
+
+def get_model():
+    """
+    Return the process-wide inference backend, loading it on first use.
+    """
+    global _model, _load_error
+    if _model is None:
+        with _lock:
+            if _model is None:
+                try:
+                    _model = _load()
+                    _load_error = None
+                except Exception as e:
+                    _load_error = str(e)
+                    raise
+                logger.info(f"Sentiment model {model_version()} loaded")
+    return _model
+
+
+def get_tokenizer():
+    """
+    The model's tokenizer. Loads only the tokenizer when the model itself
+    runs elsewhere (inference pool), reusing the in-process model's when loaded.
+    """
+    global _tokenizer
+    if _model is not None:
+        return _model.tokenizer
+    if _tokenizer is None:
+        with _lock:
+            if _tokenizer is None:
+                _tokenizer = load_tokenizer()
+    return _tokenizer
+
+
+def is_ready() -> bool:
+    return _model is not None
+
+
+def status() -> Dict[str, Any]:
+    return {
+        "ready": is_ready(),
+        "model": model_version(),
+        "error": _load_error,
+    }
+
+
+def _warm_up_sync() -> None:
+    model = get_model()
+    # One tiny forward pass so the first real request doesn't pay for lazy init
+    model.predict(["warm up"])
+
+
+async def warm_up() -> None:
+    """
+    Load the model and run a dummy inference without blocking the event loop.
+    """
+    try:
+        await asyncio.to_thread(_warm_up_sync)
+    except Exception:
+        logger.exception("Sentiment model warm-up failed")
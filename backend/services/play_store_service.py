@@ -1,14 +1,44 @@
 import asyncio
+import json
 import logging
-from typing import List, Dict, Any
+import time
+from typing import List, Dict, Any, AsyncIterator, Optional
 from fastapi import HTTPException
 from google_play_scraper import search
-from google_play_scraper.features.reviews import Sort, reviews_all
+from google_play_scraper.features.reviews import Sort, reviews, MAX_COUNT_EACH_FETCH
 
 from models.schemas import AppInfo
+from services.app_index import AppIndex, AppRecord, normalize
+from services.cache_service import CacheEntry, MemoryLRUCache
+from services.metrics import LIMITER_WAIT_SECONDS, span
+from services.single_flight import SingleFlight
+from config import settings
 
 logger = logging.getLogger(__name__)
 
+# Process-wide bound on concurrent Play Store requests, recreated if the event loop changes
+_scrape_slots: Optional[asyncio.Semaphore] = None
+_scrape_slots_loop: Optional[asyncio.AbstractEventLoop] = None
+
+# Results per Play Store search (the scraper's default) and autocomplete list
+SEARCH_RESULTS_LIMIT = 30
+# Package names are at most 255 characters
+_MAX_APP_ID_BYTES = 256
+
+# Normalized app name -> resolved app ID
+_resolved = MemoryLRUCache(
+    settings.APP_ID_CACHE_MAX_ENTRIES, settings.APP_ID_CACHE_MAX_ENTRIES * _MAX_APP_ID_BYTES
+)
+# Normalized query -> JSON list of app IDs from the last live search
+_searches = MemoryLRUCache(
+    settings.SEARCH_CACHE_MAX_ENTRIES,
+    settings.SEARCH_CACHE_MAX_ENTRIES * SEARCH_RESULTS_LIMIT * _MAX_APP_ID_BYTES,
+)
+# Every app seen in search results, for local autocomplete
+_app_index = AppIndex(settings.APP_INDEX_MAX_RECORDS)
+_search_flight = SingleFlight()
+_search_stats = {"query_hits": 0, "index_hits": 0, "index_misses": 0, "resolve_hits": 0, "resolve_misses": 0}
+
 
 def _parse_installs(installs_str: str) -> int:
     """
@@ -20,74 +50,249 @@ def _parse_installs(installs_str: str) -> int:
         return 0
 
 
-async def search_apps(query: str) -> List[AppInfo]:
+def _scrape_limiter() -> asyncio.Semaphore:
+    global _scrape_slots, _scrape_slots_loop
+    loop = asyncio.get_running_loop()
+    if _scrape_slots is None or _scrape_slots_loop is not loop:
+        _scrape_slots = asyncio.Semaphore(max(settings.SCRAPE_MAX_CONCURRENCY, 1))
+        _scrape_slots_loop = loop
+    return _scrape_slots
+
+
+async def _scrape(fn, *args, **kwargs):
     """
-    Search Play Store for apps matching `query` and return basic info.
+    Run a blocking scraper call in a thread, holding one of the
+    SCRAPE_MAX_CONCURRENCY slots so large fan-outs (bulk analysis)
+    don't flood the Play Store or the thread pool.
     """
-    try:
-        # Perform blocking search in thread
-        results = await asyncio.to_thread(search, query)
-        # Debug log full search results with installs and scores
+    limiter = _scrape_limiter()
+    waiting_since = time.perf_counter()
+    async with limiter:
+        LIMITER_WAIT_SECONDS.labels("scrape").observe(time.perf_counter() - waiting_since)
+        return await asyncio.to_thread(fn, *args, **kwargs)
+
+
+def _to_record(app: Dict[str, Any]) -> AppRecord:
+    return AppRecord(
+        app_id=app.get("appId", ""),
+        title=app.get("title") or "",
+        installs=_parse_installs(app.get("installs") or ""),
+        score=app.get("score") or 0.0,
+    )
+
+
+async def _search_upstream(key: str) -> List[AppRecord]:
+    raw_results = await _scrape(search, key)
+    records = [_to_record(app) for app in raw_results if app.get("appId")]
+    # Debug log full search results with installs and scores
+    if logger.isEnabledFor(logging.DEBUG):
         logger.debug(
-            f"Search results for '{query}': " + 
-            ", ".join(
-                f"{app['title']}({app['appId']}, installs={app.get('installs')}, score={app.get('score')})"
-                for app in results
-            )
+            "Search results for '%s': %s",
+            key,
+            ", ".join(f"{r.title}({r.app_id}, installs={r.installs}, score={r.score})" for r in records),
         )
-        return [AppInfo(appId=app["appId"], title=app["title"]) for app in results]
+    _app_index.add(records)
+    _searches.set(key, CacheEntry(json.dumps([r.app_id for r in records]), time.time()))
+    return records
+
+
+def _cached_search(key: str) -> Optional[List[AppRecord]]:
+    """
+    Results of the last live search for `key`, if younger than
+    SEARCH_CACHE_TTL_SECONDS and still in the index.
+    """
+    entry = _searches.get(key)
+    if entry is None or time.time() - entry.stored_at >= settings.SEARCH_CACHE_TTL_SECONDS:
+        return None
+    records = [_app_index.get(app_id) for app_id in json.loads(entry.value)]
+    if any(record is None for record in records):
+        return None
+    return records
+
+
+async def _live_search(query: str) -> List[AppRecord]:
+    """
+    Play Store search results for `query`, reusing the results of the same
+    normalized query when recent. Concurrent searches for the same query
+    share one upstream request.
+    """
+    key = normalize(query)
+    records = _cached_search(key)
+    if records is not None:
+        return records
+    return await _search_flight.do(key, lambda: _search_upstream(key))
+
+
+def _index_search(key: str) -> Optional[List[AppRecord]]:
+    """
+    Index matches for `key`, if there are at least APP_INDEX_MIN_RESULTS
+    of them to stand in for a live search.
+    """
+    local = _app_index.search(key, limit=SEARCH_RESULTS_LIMIT)
+    if len(local) >= settings.APP_INDEX_MIN_RESULTS:
+        return local
+    return None
+
+
+async def _await_prefix_search(key: str) -> bool:
+    """
+    While typing, each keystroke is a new query. If a search for a shorter
+    prefix is still running, wait for it, since its results may answer this
+    one from the index. Returns whether such a search finished.
+    """
+    for end in range(len(key) - 1, 0, -1):
+        task = _search_flight.task(key[:end])
+        if task is not None:
+            try:
+                await asyncio.shield(task)
+            except Exception:
+                return False
+            return True
+    return False
+
+
+async def search_apps(query: str) -> List[AppInfo]:
+    """
+    Autocomplete suggestions for `query`. Served from the local app index
+    when it has at least APP_INDEX_MIN_RESULTS matches, otherwise from a
+    (cached, coalesced) Play Store search. A search for a shorter prefix
+    still in flight is only waited for when the index can't answer yet.
+    """
+    try:
+        key = normalize(query)
+        records = _cached_search(key)
+        if records is not None:
+            _search_stats["query_hits"] += 1
+            return [AppInfo(appId=r.app_id, title=r.title) for r in records]
+
+        local = _index_search(key)
+        if local is None and await _await_prefix_search(key):
+            local = _index_search(key)
+        if local is not None:
+            _search_stats["index_hits"] += 1
+            return [AppInfo(appId=r.app_id, title=r.title) for r in local]
+
+        _search_stats["index_misses"] += 1
+        records = await _live_search(query)
+        return [AppInfo(appId=r.app_id, title=r.title) for r in records]
     except Exception as e:
         logger.exception("Error during Play Store search")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _choose_app(app_name: str, records: List[AppRecord]) -> AppRecord:
+    name = normalize(app_name)
+
+    # 1) Exact title match
+    exact = [r for r in records if normalize(r.title) == name]
+    if exact:
+        chosen = max(exact, key=lambda r: r.installs)
+        logger.info(f"Exact title match for '{app_name}' -> {chosen.app_id} (installs={chosen.installs})")
+        return chosen
+
+    # 2) Substring title match
+    substr = [r for r in records if name in normalize(r.title)]
+    if substr:
+        chosen = max(substr, key=lambda r: r.installs)
+        logger.info(f"Substring title match for '{app_name}' -> {chosen.app_id} (installs={chosen.installs})")
+        return chosen
+
+    # 3) Fallback: choose highest installs overall
+    chosen = max(records, key=lambda r: r.installs)
+    logger.info(f"Fallback highest installs for '{app_name}' -> {chosen.app_id} (installs={chosen.installs})")
+    return chosen
+
+
 async def get_app_id(app_name: str) -> str:
     """
     Resolve the Play Store package name for a given app name using heuristics:
       1) Exact title match (case-insensitive), preferring highest installs.
       2) Title contains query substring, preferring highest installs.
       3) Fallback to the app with highest installs overall.
+    Exact title matches are taken from the local app index when possible,
+    and resolutions are cached for APP_ID_CACHE_TTL_SECONDS.
     """
-    # Fetch raw search results
-    raw_results = await asyncio.to_thread(search, app_name)
-    if not raw_results:
-        logger.warning(f"No apps found when searching for '{app_name}'")
-        raise HTTPException(status_code=404, detail=f"No apps found with name: {app_name}")
-
-    # Enrich with installs count and scores
-    enriched = []
-    for app in raw_results:
-        enriched.append({
-            "appId": app.get("appId", ""),
-            "title": app.get("title", ""),
-            "installs": _parse_installs(app.get("installs", "")),
-            "score": app.get("score", 0.0),
-        })
+    key = normalize(app_name)
+    entry = _resolved.get(key)
+    if entry is not None and time.time() - entry.stored_at < settings.APP_ID_CACHE_TTL_SECONDS:
+        _search_stats["resolve_hits"] += 1
+        return entry.value
+    _search_stats["resolve_misses"] += 1
 
-    # 1) Exact title match
-    exact = [a for a in enriched if a["title"].strip().lower() == app_name.strip().lower()]
+    # Titles picked from autocomplete are already indexed
+    exact = [r for r in _app_index.search(key, limit=SEARCH_RESULTS_LIMIT) if normalize(r.title) == key]
     if exact:
-        chosen = max(exact, key=lambda a: a["installs"])
-        logger.info(
-            f"Exact title match for '{app_name}' -> {chosen['appId']} (installs={chosen['installs']})"
-        )
-        return chosen["appId"]
+        chosen = max(exact, key=lambda r: r.installs)
+        logger.info(f"Exact title match for '{app_name}' in app index -> {chosen.app_id} (installs={chosen.installs})")
+    else:
+        records = await _live_search(app_name)
+        if not records:
+            logger.warning(f"No apps found when searching for '{app_name}'")
+            raise HTTPException(status_code=404, detail=f"No apps found with name: {app_name}")
+        chosen = _choose_app(app_name, records)
 
-    # 2) Substring title match
-    substr = [a for a in enriched if app_name.strip().lower() in a["title"].strip().lower()]
-    if substr:
-        chosen = max(substr, key=lambda a: a["installs"])
-        logger.info(
-            f"Substring title match for '{app_name}' -> {chosen['appId']} (installs={chosen['installs']})"
-        )
-        return chosen["appId"]
+    app_id = chosen.app_id
+    _resolved.set(key, CacheEntry(app_id, time.time()))
+    return app_id
 
-    # 3) Fallback: choose highest installs overall
-    chosen = max(enriched, key=lambda a: a["installs"])
-    logger.info(
-        f"Fallback highest installs for '{app_name}' -> {chosen['appId']} (installs={chosen['installs']})"
-    )
-    return chosen["appId"]
+
+def cache_evictions() -> Dict[str, int]:
+    return {"app_id": _resolved.evictions, "search_query": _searches.evictions}
+
+
+def search_stats() -> Dict[str, Any]:
+    return {
+        **_search_stats,
+        "indexed_apps": len(_app_index),
+        "cached_queries": len(_searches),
+        "cached_resolutions": len(_resolved),
+        "single_flight": _search_flight.stats(),
+    }
+
+
+async def iter_app_reviews(
+    app_id: str,
+    count: int,
+    page_size: int = settings.REVIEWS_PAGE_SIZE,
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    Stream up to `count` reviews for the given package ID, newest first,
+    one page at a time. Pages are fetched with the scraper's continuation
+    token and fetching stops as soon as `count` reviews have been yielded,
+    so callers can start processing the first page while later ones load.
+    """
+    page_size = max(1, min(page_size, count, MAX_COUNT_EACH_FETCH))
+    token = None
+    fetched = 0
+    page_number = 0
+    while fetched < count:
+        page_number += 1
+        try:
+            with span("fetch_page", app_id=app_id, page=page_number):
+                # Perform blocking call in thread
+                page, token = await _scrape(
+                    reviews,
+                    app_id,
+                    lang="en",
+                    country="us",
+                    sort=Sort.NEWEST,
+                    count=page_size,
+                    continuation_token=token
+                )
+        except Exception as e:
+            logger.exception(f"Error fetching reviews for {app_id}")
+            raise HTTPException(status_code=500, detail=str(e))
+
+        # The token pins the page size, so the last page may overshoot `count`
+        page = page[:count - fetched]
+        if not page:
+            break
+        fetched += len(page)
+        logger.debug("Retrieved page of %d reviews for %s (%d/%d)", len(page), app_id, fetched, count)
+        yield page
+
+        if token is None or token.token is None:
+            break
 
 
 async def get_app_reviews(app_id: str, count: int) -> List[Dict[str, Any]]:
@@ -95,18 +300,8 @@ async def get_app_reviews(app_id: str, count: int) -> List[Dict[str, Any]]:
     Fetch up to `count` reviews for the given package ID, sorted by newest.
     Returns a list of review dicts.
     """
-    try:
-        # Perform blocking call in thread
-        all_reviews = await asyncio.to_thread(
-            reviews_all,
-            app_id,
-            lang="en",
-            country="us",
-            sort=Sort.NEWEST,
-            count=count
-        )
-        logger.info(f"Retrieved {len(all_reviews)} reviews for {app_id}, returning first {count}")
-        return all_reviews[:count]
-    except Exception as e:
-        logger.exception(f"Error fetching reviews for {app_id}")
-        raise HTTPException(status_code=500, detail=str(e))
+    all_reviews: List[Dict[str, Any]] = []
+    async for page in iter_app_reviews(app_id, count):
+        all_reviews.extend(page)
+    logger.info(f"Retrieved {len(all_reviews)} reviews for {app_id}")
+    return all_reviews
@@ -0,0 +1,108 @@
+import threading
+from collections import OrderedDict
+from typing import List, Sequence, Tuple
+
+TokenIds = Tuple[int, ...]
+
+TRUNCATION_STRATEGIES = ("head", "head_tail")
+
+
+class TextPreprocessor:
+    """
+    Tokenizes review texts into model-ready token ids, truncated to
+    `max_tokens` (including special tokens), with an LRU cache so repeated
+    texts are only tokenized once.
+
+    "head" keeps the beginning of a long review; "head_tail" keeps the
+    first `head_tokens` and fills the rest of the budget from the end,
+    where reviews tend to state their verdict.
+    """
+
+    def __init__(
+        self,
+        tokenizer,
+        max_tokens: int,
+        strategy: str = "head_tail",
+        head_tokens: int = 64,
+        cache_size: int = 10000,
+    ):
+        if strategy not in TRUNCATION_STRATEGIES:
+            raise ValueError(f"Unknown truncation strategy '{strategy}'; expected one of {', '.join(TRUNCATION_STRATEGIES)}")
+        self.tokenizer = tokenizer
+        self.strategy = strategy
+        self.cache_size = cache_size
+        self._budget = max(max_tokens - tokenizer.num_special_tokens_to_add(), 1)
+        self._head = min(max(head_tokens, 0), self._budget)
+        self._cache: "OrderedDict[str, TokenIds]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _truncate(self, ids: List[int]) -> List[int]:
+        if len(ids) <= self._budget:
+            return ids
+        if self.strategy == "head" or self._head == self._budget:
+            return ids[:self._budget]
+        tail = self._budget - self._head
+        return ids[:self._head] + ids[-tail:]
+
+    def encode(self, texts: Sequence[str]) -> List[TokenIds]:
+        """
+        Token ids (with special tokens) for each text, in input order.
+        """
+        results: List[TokenIds] = [()] * len(texts)
+        missing: "OrderedDict[str, List[int]]" = OrderedDict()
+        with self._lock:
+            for i, text in enumerate(texts):
+                cached = self._cache.get(text)
+                if cached is not None:
+                    self._cache.move_to_end(text)
+                    results[i] = cached
+                    self.hits += 1
+                else:
+                    missing.setdefault(text, []).append(i)
+                    self.misses += 1
+
+        if missing:
+            # One batched tokenizer call for everything not in the cache
+            encoded = self.tokenizer(list(missing), add_special_tokens=False, verbose=False)["input_ids"]
+            with self._lock:
+                for (text, positions), ids in zip(missing.items(), encoded):
+                    token_ids = tuple(self.tokenizer.build_inputs_with_special_tokens(self._truncate(ids)))
+                    for i in positions:
+                        results[i] = token_ids
+                    self._cache[text] = token_ids
+                    self._cache.move_to_end(text)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+                    self.evictions += 1
+        return results
+
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+
+def bucket_by_length(batch: Sequence[Sequence[int]], max_padding_ratio: float) -> List[List[int]]:
+    """
+    Group batch positions into length buckets so padding stays bounded.
+
+    Positions are sorted by sequence length and split greedily: a bucket
+    is closed when adding the next (longer) sequence would make padded
+    tokens exceed `1 + max_padding_ratio` times the real tokens.
+    """
+    order = sorted(range(len(batch)), key=lambda i: len(batch[i]))
+    buckets: List[List[int]] = []
+    current: List[int] = []
+    real_tokens = 0
+    for i in order:
+        length = len(batch[i])
+        if current and length * (len(current) + 1) > (real_tokens + length) * (1 + max_padding_ratio):
+            buckets.append(current)
+            current, real_tokens = [], 0
+        current.append(i)
+        real_tokens += length
+    if current:
+        buckets.append(current)
+    return buckets
@@ -0,0 +1,157 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def content_hash(text: Optional[str]) -> str:
+    """
+    Stable fingerprint of a review's text, so edited reviews get re-scored.
+    """
+    return hashlib.sha1((text or "").encode("utf-8")).hexdigest()
+
+
+def _timestamp(at: Any) -> float:
+    if isinstance(at, datetime):
+        return at.timestamp()
+    if isinstance(at, (int, float)):
+        return float(at)
+    return 0.0
+
+
+class ScoreStore:
+    """
+    Persistent per-review sentiment scores keyed by
+    (model version, reviewId, content hash).
+
+    Each row also remembers which app the review belongs to, its text and
+    its timestamp, so a refresh can rebuild the "newest N reviews" window
+    from stored rows once it reaches reviews it has already scored.
+    """
+
+    def __init__(self, path: str, max_reviews_per_app: int):
+        self.path = path
+        self.max_reviews_per_app = max_reviews_per_app
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS review_scores ("
+            " model_version TEXT NOT NULL,"
+            " review_id TEXT NOT NULL,"
+            " content_hash TEXT NOT NULL,"
+            " app_id TEXT NOT NULL,"
+            " content TEXT NOT NULL,"
+            " at REAL NOT NULL,"
+            " score REAL NOT NULL,"
+            " PRIMARY KEY (model_version, review_id, content_hash))"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS review_scores_app"
+            " ON review_scores(app_id, model_version, at)"
+        )
+        self._conn.commit()
+
+    def lookup(self, model_version: str, keys: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], float]:
+        """
+        Return stored scores for the given (reviewId, content hash) pairs.
+        """
+        keys = list(keys)
+        if not keys:
+            return {}
+        found: Dict[Tuple[str, str], float] = {}
+        with self._lock:
+            for review_id, digest in keys:
+                row = self._conn.execute(
+                    "SELECT score FROM review_scores"
+                    " WHERE model_version = ? AND review_id = ? AND content_hash = ?",
+                    (model_version, review_id, digest),
+                ).fetchone()
+                if row is not None:
+                    found[(review_id, digest)] = row[0]
+        return found
+
+    def recent_reviews(
+        self, app_id: str, model_version: str, exclude: Iterable[str], limit: int
+    ) -> List[Dict[str, Any]]:
+        """
+        Newest stored reviews for `app_id`, skipping the given review IDs.
+        """
+        if limit <= 0:
+            return []
+        exclude = set(exclude)
+        rows: List[Dict[str, Any]] = []
+        with self._lock:
+            cur = self._conn.execute(
+                "SELECT review_id, content, score FROM review_scores"
+                " WHERE app_id = ? AND model_version = ?"
+                " ORDER BY at DESC",
+                (app_id, model_version),
+            )
+            for review_id, content, score in cur:
+                if review_id in exclude:
+                    continue
+                rows.append({"review_text": content, "sentiment_score": score})
+                if len(rows) >= limit:
+                    break
+        return rows
+
+    def save(self, app_id: str, model_version: str, scored: Iterable[Tuple[Dict[str, Any], str, float]]) -> None:
+        """
+        Store newly scored `(review, content hash, score)` triples, replacing
+        rows for earlier versions of the same review's text.
+        """
+        with self._lock:
+            for review, digest, score in scored:
+                review_id = review.get("reviewId")
+                if not review_id:
+                    continue
+                self._conn.execute(
+                    "DELETE FROM review_scores WHERE model_version = ? AND review_id = ?",
+                    (model_version, review_id),
+                )
+                self._conn.execute(
+                    "INSERT INTO review_scores"
+                    " (model_version, review_id, content_hash, app_id, content, at, score)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        model_version,
+                        review_id,
+                        digest,
+                        app_id,
+                        review.get("content") or "",
+                        _timestamp(review.get("at")),
+                        score,
+                    ),
+                )
+            # Only the newest reviews of an app can ever fill a window again
+            self._conn.execute(
+                "DELETE FROM review_scores WHERE rowid IN ("
+                " SELECT rowid FROM review_scores WHERE app_id = ? AND model_version = ?"
+                " ORDER BY at DESC LIMIT -1 OFFSET ?)",
+                (app_id, model_version, self.max_reviews_per_app),
+            )
+            self._conn.commit()
+
+
+def build_score_store() -> Optional[ScoreStore]:
+    """
+    Open the score store from settings. An empty SCORE_STORE_PATH disables it.
+    """
+    if not settings.SCORE_STORE_PATH:
+        return None
+    try:
+        return ScoreStore(settings.SCORE_STORE_PATH, settings.SCORE_STORE_MAX_REVIEWS_PER_APP)
+    except sqlite3.Error:
+        logger.exception(f"Could not open score store at {settings.SCORE_STORE_PATH}; scoring every review")
+        return None
@@ -1,39 +1,165 @@
 import asyncio
-from typing import List, Dict, Any
-from transformers import pipeline
-from aiolimiter import AsyncLimiter
+import logging
+import threading
+from typing import List, Dict, Any, Optional, Sequence
 
-_sentiment = pipeline("sentiment-analysis")
+from config import settings
+from services import inference_pool, model_registry
+from services.inference_engine import BatchInferenceEngine
+from services.preprocessing import TextPreprocessor, TokenIds, bucket_by_length
 
-MAX_CONCURRENT_WORKERS = 5                # max simultaneous model inferences
-RATE_LIMIT_CALLS = 10                     # max calls per time period
-RATE_LIMIT_PERIOD = 1.0                   # seconds
+logger = logging.getLogger(__name__)
 
-_semaphore = asyncio.Semaphore(MAX_CONCURRENT_WORKERS)
-_rate_limiter = AsyncLimiter(RATE_LIMIT_CALLS, RATE_LIMIT_PERIOD)
+_preprocessor: Optional[TextPreprocessor] = None
+_preprocessor_lock = threading.Lock()
 
-async def _analyze_single(text: str) -> Dict[str, Any]:
+
+def _get_preprocessor() -> TextPreprocessor:
+    global _preprocessor
+    if _preprocessor is None:
+        with _preprocessor_lock:
+            if _preprocessor is None:
+                _preprocessor = TextPreprocessor(
+                    model_registry.get_tokenizer(),
+                    max_tokens=settings.INFERENCE_MAX_TOKENS,
+                    strategy=settings.INFERENCE_TRUNCATION,
+                    head_tokens=settings.INFERENCE_TRUNCATION_HEAD_TOKENS,
+                    cache_size=settings.TOKEN_CACHE_SIZE,
+                )
+    return _preprocessor
+
+
+def _infer_batch(batch: List[TokenIds]) -> List[float]:
+    """
+    Score a batch of tokenized texts, in a pool worker process if one is
+    configured, otherwise in this process. The batch is split into length
+    buckets so short reviews are not padded to the longest one; scores are
+    returned in batch order.
+    """
+    pool = inference_pool.get_pool()
+    predict = pool.predict if pool is not None else model_registry.get_model().predict_encoded
+    scores: List[float] = [0.0] * len(batch)
+    for bucket in bucket_by_length(batch, settings.INFERENCE_MAX_PADDING_RATIO):
+        for i, score in zip(bucket, predict([batch[i] for i in bucket])):
+            scores[i] = score
+    return scores
+
+
+_engine = BatchInferenceEngine(
+    _infer_batch,
+    max_batch_size=settings.INFERENCE_MAX_BATCH_SIZE,
+    max_wait_ms=settings.INFERENCE_MAX_WAIT_MS,
+    # One batch per pool worker can be in flight; in-process inference is serialized
+    max_concurrency=settings.INFERENCE_MAX_CONCURRENT_BATCHES or max(settings.INFERENCE_POOL_WORKERS, 1),
+)
+
+
+def model_version() -> str:
+    """
+    Identifier of the configured model; stored scores are only reused for
+    the same version.
+    """
+    return model_registry.model_version()
+
+
+async def warm_up() -> None:
+    """
+    Start the inference pool, or load the in-process model, ahead of the
+    first request.
+    """
+    pool = inference_pool.get_pool()
+    if pool is None:
+        await model_registry.warm_up()
+    else:
+        try:
+            await asyncio.to_thread(pool.start)
+        except Exception:
+            logger.exception("Inference pool start-up failed")
+    try:
+        await asyncio.to_thread(_get_preprocessor)
+    except Exception:
+        logger.exception("Tokenizer warm-up failed")
+
+
+def inference_status() -> Dict[str, Any]:
+    pool = inference_pool.get_pool()
+    if pool is None:
+        return model_registry.status()
+    return {
+        "ready": pool.ready,
+        "model": model_registry.model_version(),
+        "pool": settings.INFERENCE_POOL_ADDRESS or f"{settings.INFERENCE_POOL_WORKERS} local workers",
+        "error": pool.error,
+    }
+
+
+async def close() -> None:
+    await _engine.close()
+    await asyncio.to_thread(inference_pool.close_pool)
+
+
+def token_cache_stats() -> Optional[Dict[str, int]]:
+    """
+    Tokenizer cache counters, or None before the tokenizer is loaded.
     """
-    Analyze a single review text under concurrency and rate limits.
+    if _preprocessor is None:
+        return None
+    return {
+        "hits": _preprocessor.hits,
+        "misses": _preprocessor.misses,
+        "evictions": _preprocessor.evictions,
+        "entries": len(_preprocessor),
+    }
+
+
+def queue_depth() -> int:
+    return _engine.pending
+
+
+def has_content(review: Dict[str, Any]) -> bool:
     """
-    async with _semaphore:
-        async with _rate_limiter:
-            result = await asyncio.to_thread(_sentiment, [text])
-    res = result[0]
-    label = res.get("label", "").upper()
-    score = res.get("score", 0.0)
-    sentiment_score = score if label == "POSITIVE" else -score
-    return {"review_text": text, "sentiment_score": sentiment_score}
+    Reviews without text (None or whitespace only) are skipped, not scored.
+    """
+    content = review.get("content")
+    return bool(content and content.strip())
+
+
+async def score_texts(texts: Sequence[str]) -> List[float]:
+    """
+    Score texts through the shared batching engine, in input order.
+
+    Texts are tokenized (and truncated) up front, then submitted shortest
+    first so that neighbouring items, which end up in the same engine
+    batch, have similar lengths.
+    """
+    if not texts:
+        return []
+    encoded = await asyncio.to_thread(_get_preprocessor().encode, list(texts))
+    order = sorted(range(len(encoded)), key=lambda i: len(encoded[i]))
+    results = await _engine.submit_many([encoded[i] for i in order])
+    scores: List[float] = [0.0] * len(encoded)
+    for i, score in zip(order, results):
+        scores[i] = score
+    return scores
+
+
+async def _analyze_batch(reviews: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    texts = [r["content"] for r in reviews if has_content(r)]
+    scores = await score_texts(texts)
+    return [
+        {"review_text": text, "sentiment_score": score}
+        for text, score in zip(texts, scores)
+    ]
 
 async def analyze_reviews_concurrent(
     reviews: List[Dict[str, Any]]
 ) -> List[Dict[str, Any]]:
     """
-    Analyze a list of reviews concurrently with rate limiting.
+    Analyze a list of reviews; texts from all in-flight requests are
+    batched together by the inference engine. Reviews without text are
+    skipped.
     """
-    tasks = [asyncio.create_task(_analyze_single(r.get("content", ""))) for r in reviews]
-    analyzed = await asyncio.gather(*tasks)
-    return analyzed
+    return await _analyze_batch(reviews)
 
 
 def calculate_average_sentiment(analyzed_reviews: List[Dict[str, Any]]) -> float:
@@ -0,0 +1,59 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls for the same key into one execution.
+
+    The first caller for a key (the leader) starts the work as a task;
+    callers arriving while it is still running await the same task instead
+    of repeating the work. The task is shielded, so a caller that
+    disconnects does not cancel the work for everyone else.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._inflight.get(key)
+        if task is None:
+            self.executions += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception as retrieved in case every caller went away
+        if not task.cancelled():
+            task.exception()
+
+    def task(self, key: str) -> Optional[asyncio.Task]:
+        """
+        The in-flight task for `key`, if any, for callers that want to wait
+        on it without starting the work themselves.
+        """
+        return self._inflight.get(key)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._inflight
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._inflight)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "in_flight": self.in_flight,
+        }
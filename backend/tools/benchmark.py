@@ -0,0 +1,388 @@
+"""
+Benchmark the analyze and autocomplete paths against the offline fake Play Store.
+
+Run from the backend directory:
+
+    python -m tools.benchmark
+    python -m tools.benchmark --backends torch,torch-int8,onnx --batch-sizes 1,8,32 \\
+        --concurrency 1,8,32 --requests 64 --output bench.json
+    python -m tools.benchmark --compare bench.json
+
+Every (backend, batch size) pair gets its own API server, started with
+`python -m tools.fake_play_store` in a scratch directory and benchmarked
+once /ready passes. Each scenario then runs at every concurrency level:
+
+- analyze: POST /analyze for distinct apps, with the result cache and score
+  store disabled so every request fetches and scores its reviews
+- search: GET /search-apps for typed prefixes of app titles
+
+Results (p50/p95/p99 latency, requests/s, reviews scored/s and peak RSS of
+the server plus any inference workers) are written as JSON. --compare
+prints the change against an earlier results file.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import aiohttp
+
+from config import settings
+from services.model_registry import onnx_path
+from tools.fake_play_store import FakePlayStore
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIOS = ("analyze", "search")
+
+
+def _csv(value: str, cast=str) -> List[Any]:
+    return [cast(v.strip()) for v in value.split(",") if v.strip()]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _percentile(ordered: List[float], p: float) -> float:
+    # Nearest-rank percentile of an already sorted list
+    if not ordered:
+        return 0.0
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def _process_tree(pid: int) -> List[int]:
+    children: Dict[int, List[int]] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name may contain spaces; fields resume after ")"
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    tree, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        tree.append(current)
+        stack.extend(children.get(current, []))
+    return tree
+
+
+def _reset_peak_rss(pid: int) -> None:
+    # "5" resets the VmHWM high-water mark (Linux); best effort elsewhere
+    for member in _process_tree(pid) if os.path.isdir("/proc") else []:
+        try:
+            with open(f"/proc/{member}/clear_refs", "w") as f:
+                f.write("5")
+        except OSError:
+            pass
+
+
+def _peak_rss_mb(pid: int) -> Optional[float]:
+    """
+    Peak resident memory of `pid` and its descendants (inference pool
+    workers) since the last reset, or None where /proc is unavailable.
+    """
+    if not os.path.isdir("/proc"):
+        return None
+    total_kb = 0
+    for member in _process_tree(pid):
+        try:
+            with open(f"/proc/{member}/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        total_kb += int(line.split()[1])
+                        break
+        except OSError:
+            continue
+    return round(total_kb / 1024, 1)
+
+
+class Server:
+    """
+    An API server process backed by the fake Play Store, configured
+    through environment variables like a normal deployment.
+    """
+
+    def __init__(self, env: Dict[str, str], args: argparse.Namespace):
+        self.port = _free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        self.env = env
+        self.args = args
+        self.process: Optional[subprocess.Popen] = None
+        self._scratch = tempfile.TemporaryDirectory(prefix="bench-")
+        self._log_path = os.path.join(self._scratch.name, "server.log")
+
+    def start(self) -> Dict[str, Any]:
+        env = {**os.environ, **self.env}
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, [BACKEND_DIR, env.get("PYTHONPATH")]))
+        with open(self._log_path, "w") as log:
+            self.process = subprocess.Popen(
+                [
+                    sys.executable, "-m", "tools.fake_play_store",
+                    "--port", str(self.port),
+                    "--apps", str(self.args.apps),
+                    "--latency-ms", str(self.args.latency_ms),
+                    "--seed", str(self.args.seed),
+                ],
+                cwd=self._scratch.name,
+                env=env,
+                stdout=log,
+                stderr=subprocess.STDOUT,
+            )
+        try:
+            return asyncio.run(self._wait_ready())
+        except RuntimeError as e:
+            with open(self._log_path) as log:
+                tail = "".join(log.readlines()[-20:])
+            raise RuntimeError(f"{e}; server log:\n{tail}") from e
+
+    async def _wait_ready(self) -> Dict[str, Any]:
+        deadline = time.monotonic() + self.args.startup_timeout
+        async with aiohttp.ClientSession() as session:
+            while time.monotonic() < deadline:
+                if self.process.poll() is not None:
+                    raise RuntimeError(f"Server exited with code {self.process.returncode} during startup")
+                try:
+                    async with session.get(f"{self.base_url}/ready") as resp:
+                        status = await resp.json()
+                        if resp.status == 200:
+                            return status
+                        if status.get("error"):
+                            raise RuntimeError(f"Model failed to load: {status['error']}")
+                except aiohttp.ClientError:
+                    pass
+                await asyncio.sleep(0.5)
+        raise RuntimeError(f"Server not ready after {self.args.startup_timeout}s")
+
+    def stop(self) -> None:
+        if self.process is not None and self.process.poll() is None:
+            # SIGINT lets uvicorn run the lifespan shutdown (closes inference workers)
+            self.process.send_signal(signal.SIGINT)
+            try:
+                self.process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        self._scratch.cleanup()
+
+
+def _analyze_requests(fake: FakePlayStore, count: int, offset: int) -> List[Tuple[str, str, Any]]:
+    apps = fake.apps
+    return [("POST", "/analyze", {"appName": apps[(offset + i) % len(apps)]["title"]}) for i in range(count)]
+
+
+def _search_requests(fake: FakePlayStore, count: int, offset: int) -> List[Tuple[str, str, Any]]:
+    # Keystroke-by-keystroke prefixes of app titles, as the autocomplete sends them
+    queries: List[str] = []
+    i = offset
+    while len(queries) < count:
+        title = fake.apps[i % len(fake.apps)]["title"].lower()
+        queries.extend(title[:n] for n in range(2, len(title) + 1))
+        i += 1
+    return [("GET", f"/search-apps/{q}", None) for q in queries[:count]]
+
+
+async def _drive(base_url: str, requests: List[Tuple[str, str, Any]], concurrency: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    errors = 0
+    reviews = 0
+    pending = iter(requests)
+
+    async def _client(session: aiohttp.ClientSession) -> None:
+        nonlocal errors, reviews
+        for method, path, body in pending:
+            started = time.perf_counter()
+            try:
+                async with session.request(method, base_url + path, json=body) as resp:
+                    payload = await resp.json()
+                    ok = resp.status == 200
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+                ok, payload = False, None
+            latencies.append((time.perf_counter() - started) * 1000)
+            if not ok:
+                errors += 1
+            elif isinstance(payload, dict):
+                reviews += payload.get("reviews_analyzed", 0)
+
+    timeout = aiohttp.ClientTimeout(total=None)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        started = time.perf_counter()
+        await asyncio.gather(*(_client(session) for _ in range(concurrency)))
+        duration = time.perf_counter() - started
+
+    ordered = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "duration_s": round(duration, 3),
+        "requests_per_s": round(len(latencies) / duration, 2) if duration else 0.0,
+        "reviews_per_s": round(reviews / duration, 1) if duration else 0.0,
+        "latency_ms": {
+            "p50": round(_percentile(ordered, 50), 2),
+            "p95": round(_percentile(ordered, 95), 2),
+            "p99": round(_percentile(ordered, 99), 2),
+            "mean": round(sum(ordered) / len(ordered), 2) if ordered else 0.0,
+            "max": round(ordered[-1], 2) if ordered else 0.0,
+        },
+    }
+
+
+def _server_env(backend: str, batch_size: int, args: argparse.Namespace) -> Dict[str, str]:
+    env = {
+        "INFERENCE_BACKEND": backend,
+        "INFERENCE_MAX_BATCH_SIZE": str(batch_size),
+        "DEFAULT_REVIEWS_COUNT": str(args.reviews),
+        # Measure the full fetch + inference path on every request
+        "CACHE_TTL_SECONDS": "0",
+        "CACHE_STALE_TTL_SECONDS": "0",
+        "CACHE_DB_PATH": "",
+        "SCORE_STORE_PATH": "",
+        # Reuse one ONNX export across servers instead of exporting per scratch dir
+        "ONNX_MODEL_PATH": settings.ONNX_MODEL_PATH or os.path.join(BACKEND_DIR, onnx_path()),
+    }
+    for item in args.env:
+        key, _, value = item.partition("=")
+        env[key] = value
+    return env
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    fake = FakePlayStore(args.apps, seed=args.seed)
+    runs: List[Dict[str, Any]] = []
+    for backend in args.backends:
+        for batch_size in args.batch_sizes:
+            server = Server(_server_env(backend, batch_size, args), args)
+            print(f"Starting server: backend={backend} batch_size={batch_size}", file=sys.stderr)
+            try:
+                model = server.start().get("model")
+                # Warm up the request path once outside the measurements
+                asyncio.run(_drive(server.base_url, _analyze_requests(fake, 1, len(fake.apps) - 1), 1))
+                offset = 0
+                for scenario in args.scenarios:
+                    for concurrency in args.concurrency:
+                        build = _analyze_requests if scenario == "analyze" else _search_requests
+                        requests = build(fake, args.requests, offset)
+                        offset += args.requests
+                        _reset_peak_rss(server.process.pid)
+                        result = asyncio.run(_drive(server.base_url, requests, concurrency))
+                        result.update(
+                            scenario=scenario,
+                            backend=backend,
+                            batch_size=batch_size,
+                            concurrency=concurrency,
+                            model=model,
+                            peak_rss_mb=_peak_rss_mb(server.process.pid),
+                        )
+                        runs.append(result)
+                        print(_format_row(result), file=sys.stderr)
+            finally:
+                server.stop()
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "reviews_per_request": args.reviews,
+            "latency_ms_per_scrape": args.latency_ms,
+            "env": args.env,
+        },
+        "runs": runs,
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _format_row(r: Dict[str, Any]) -> str:
+    lat = r["latency_ms"]
+    return (
+        f"{r['scenario']:<8} {r['backend']:<10} batch={r['batch_size']:<3} conc={r['concurrency']:<3} "
+        f"p50={lat['p50']:.1f}ms p95={lat['p95']:.1f}ms p99={lat['p99']:.1f}ms "
+        f"req/s={r['requests_per_s']:.1f} reviews/s={r['reviews_per_s']:.0f} "
+        f"rss={r['peak_rss_mb']}MB errors={r['errors']}"
+    )
+
+
+def _run_key(r: Dict[str, Any]) -> Tuple:
+    return r["scenario"], r["backend"], r["batch_size"], r["concurrency"]
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    """
+    Print p95 latency and reviews/s changes for runs present in both results.
+    """
+    previous = {_run_key(r): r for r in baseline["runs"]}
+    print(f"Compared with {baseline['meta'].get('git_commit')} ({baseline['meta'].get('timestamp')}):", file=sys.stderr)
+    for r in current["runs"]:
+        old = previous.get(_run_key(r))
+        if old is None:
+            continue
+        def change(new: float, before: float) -> str:
+            return f"{(new - before) / before * 100:+.1f}%" if before else "n/a"
+        print(
+            f"{r['scenario']:<8} {r['backend']:<10} batch={r['batch_size']:<3} conc={r['concurrency']:<3} "
+            f"p95 {change(r['latency_ms']['p95'], old['latency_ms']['p95'])} "
+            f"reviews/s {change(r['reviews_per_s'], old['reviews_per_s'])}",
+            file=sys.stderr,
+        )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", type=_csv, default=["torch"], help="comma-separated INFERENCE_BACKEND values")
+    parser.add_argument("--batch-sizes", type=lambda v: _csv(v, int), default=[settings.INFERENCE_MAX_BATCH_SIZE])
+    parser.add_argument("--concurrency", type=lambda v: _csv(v, int), default=[1, 8])
+    parser.add_argument("--scenarios", type=_csv, default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=32, help="requests per scenario and concurrency level")
+    parser.add_argument("--reviews", type=int, default=settings.DEFAULT_REVIEWS_COUNT, help="reviews per analyze request")
+    parser.add_argument("--apps", type=int, default=400, help="apps in the fake Play Store")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="simulated delay per Play Store call")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="extra server setting")
+    parser.add_argument("--startup-timeout", type=float, default=300.0)
+    parser.add_argument("--output", help="write JSON results here instead of stdout")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    unknown = [s for s in args.scenarios if s not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+
+    results = run(args)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(results, json.load(f))
+    return 1 if any(r["errors"] for r in results["runs"]) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,59 @@
+"""
+Check that an optimized inference backend scores like stock PyTorch.
+
+Run from the backend directory:
+
+    python -m tools.check_backend_parity --backend torch-int8
+    python -m tools.check_backend_parity --backend onnx --texts reviews.txt --tolerance 0.01
+
+Prints a JSON report and exits non-zero when the mean sentiment score of the
+candidate differs from the PyTorch baseline by more than the tolerance.
+"""
+import argparse
+import json
+import sys
+from typing import List
+
+from services import model_registry
+from services.inference_backends import BACKENDS, build_backend, check_parity
+
+SAMPLE_REVIEWS = [
+    "Love this app, works perfectly every time.",
+    "Terrible update. Crashes on startup and support never answers.",
+    "It's okay, does what it says but the ads are annoying.",
+    "Best app I've downloaded this year!",
+    "Stopped syncing after the last update, please fix.",
+    "Great design, very easy to use.",
+    "Keeps logging me out. Uninstalled.",
+    "Not bad, but battery drain is noticeable.",
+    "Customer service was helpful and quick to respond.",
+    "Way too many notifications, can't turn them off.",
+    "Five stars, exactly what I needed.",
+    "The new layout is confusing and slow.",
+]
+
+
+def _read_texts(path: str) -> List[str]:
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=[b for b in BACKENDS if b != "torch"], required=True)
+    parser.add_argument("--texts", help="file with one review per line (defaults to built-in samples)")
+    parser.add_argument("--tolerance", type=float, default=0.02, help="max allowed difference of mean scores")
+    args = parser.parse_args()
+
+    texts = _read_texts(args.texts) if args.texts else SAMPLE_REVIEWS
+    tokenizer, model = model_registry.load_model()
+    baseline = build_backend("torch", tokenizer, model, model_registry.onnx_path())
+    candidate = build_backend(args.backend, tokenizer, model, model_registry.onnx_path())
+
+    report = check_parity(candidate, baseline, texts, args.tolerance)
+    print(json.dumps(report, indent=2))
+    return 0 if report["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
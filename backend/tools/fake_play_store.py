@@ -0,0 +1,193 @@
+"""
+Offline stand-in for the Play Store, for benchmarks and local development.
+
+`FakePlayStore` mimics the `search` and `reviews` functions of
+google_play_scraper with deterministic synthetic apps and reviews, and can
+add simulated network latency. `install` swaps it into play_store_service.
+
+Run the API against it (no network access needed) from the backend directory:
+
+    python -m tools.fake_play_store --port 8000 --apps 200 --latency-ms 50
+"""
+import argparse
+import datetime
+import logging
+import random
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+from google_play_scraper.features.reviews import Sort, _ContinuationToken
+
+logger = logging.getLogger(__name__)
+
+_ADJECTIVES = [
+    "Smart", "Quick", "Super", "Daily", "Happy", "Pocket", "Cloud", "Photo", "Music", "Fit",
+    "Secure", "Simple", "Magic", "Family", "Travel", "Budget", "Sleep", "Word", "Color", "Pixel",
+]
+_NOUNS = [
+    "Notes", "Messenger", "Scanner", "Wallet", "Tracker", "Editor", "Player", "Browser", "Weather",
+    "Calendar", "Keyboard", "Launcher", "Fitness", "Recipes", "Translator", "Puzzle", "Maps",
+    "Camera", "Radio", "Planner",
+]
+_POSITIVE = [
+    "Love this app, works perfectly every time.",
+    "Great design and very easy to use.",
+    "Customer support was quick and helpful.",
+    "Best app of its kind that I have tried.",
+    "The latest update made everything faster.",
+    "Does exactly what I need without fuss.",
+]
+_NEGATIVE = [
+    "Crashes on startup since the last update.",
+    "Way too many ads, it is barely usable.",
+    "Keeps logging me out and losing my data.",
+    "Battery drain is terrible with this installed.",
+    "Support never answered my emails.",
+    "The new layout is confusing and slow.",
+]
+_FILLER = [
+    "I have been using it for a few months now.",
+    "My whole family uses it on their phones.",
+    "I switched from another app last year.",
+    "It syncs with my tablet as well.",
+    "Notifications arrive on time.",
+    "The settings menu has a lot of options.",
+]
+
+
+def _rng(*parts: Any) -> random.Random:
+    # crc32 rather than hash() so data is identical across processes
+    return random.Random(zlib.crc32(":".join(map(str, parts)).encode()))
+
+
+class FakePlayStore:
+    """
+    Deterministic synthetic Play Store: `apps` apps with `reviews_per_app`
+    reviews each, generated on demand from `seed`. Review lengths vary from
+    one sentence to several hundred tokens so truncation and length
+    bucketing are exercised.
+    """
+
+    def __init__(self, apps: int = 200, reviews_per_app: int = 1000, latency_ms: float = 0.0, seed: int = 0):
+        self.reviews_per_app = reviews_per_app
+        self.latency_ms = latency_ms
+        self.seed = seed
+        self.search_calls = 0
+        self.review_calls = 0
+        self.apps: List[Dict[str, Any]] = []
+        for i in range(apps):
+            rng = _rng(seed, "app", i)
+            title = f"{_ADJECTIVES[i % len(_ADJECTIVES)]} {_NOUNS[(i // len(_ADJECTIVES)) % len(_NOUNS)]}"
+            if i >= len(_ADJECTIVES) * len(_NOUNS):
+                title = f"{title} {i}"
+            installs = 10 ** rng.randint(3, 9)
+            self.apps.append({
+                "appId": f"com.fake.{title.lower().replace(' ', '')}",
+                "title": title,
+                "installs": f"{installs:,}+",
+                "score": round(rng.uniform(2.5, 4.9), 1),
+                "developer": f"{_NOUNS[i % len(_NOUNS)]} Labs",
+            })
+        self._by_id = {app["appId"]: app for app in self.apps}
+
+    def _sleep(self) -> None:
+        if self.latency_ms > 0:
+            time.sleep(self.latency_ms / 1000)
+
+    def search(self, query: str, n_hits: int = 30, lang: str = "en", country: str = "us") -> List[Dict[str, Any]]:
+        self.search_calls += 1
+        self._sleep()
+        words = query.lower().split()
+        matches = [
+            app for app in self.apps
+            if all(any(t.startswith(w) for t in app["title"].lower().split()) for w in words)
+        ]
+        return [dict(app) for app in matches[:n_hits]]
+
+    def review(self, app_id: str, index: int) -> Dict[str, Any]:
+        """
+        The `index`-th newest review of `app_id`.
+        """
+        rng = _rng(self.seed, app_id, index)
+        positive = rng.random() < 0.6
+        sentences = [rng.choice(_POSITIVE if positive else _NEGATIVE)]
+        # Mostly short reviews with a long tail of very long ones
+        for _ in range(min(int(rng.expovariate(0.35)), 40)):
+            sentences.append(rng.choice(_FILLER + (_POSITIVE if positive else _NEGATIVE)))
+        rng.shuffle(sentences)
+        return {
+            "reviewId": f"{app_id}:{self.reviews_per_app - index}",
+            "userName": f"user{rng.randint(1, 10 ** 6)}",
+            "content": " ".join(sentences),
+            "score": rng.randint(4, 5) if positive else rng.randint(1, 2),
+            "thumbsUpCount": rng.randint(0, 50),
+            "at": datetime.datetime(2024, 1, 1) - datetime.timedelta(minutes=index),
+        }
+
+    def reviews(
+        self,
+        app_id: str,
+        lang: str = "en",
+        country: str = "us",
+        sort: Sort = Sort.NEWEST,
+        count: int = 100,
+        filter_score_with: Optional[int] = None,
+        continuation_token: Optional[_ContinuationToken] = None,
+    ) -> Tuple[List[Dict[str, Any]], _ContinuationToken]:
+        self.review_calls += 1
+        self._sleep()
+        start = 0
+        if continuation_token is not None:
+            # Like the real scraper, the token pins the page size
+            if continuation_token.token is None:
+                return [], continuation_token
+            start = int(continuation_token.token)
+            count = continuation_token.count
+        total = self.reviews_per_app if app_id in self._by_id else 0
+        end = min(start + count, total)
+        page = [self.review(app_id, i) for i in range(start, end)]
+        token = str(end) if end < total else None
+        return page, _ContinuationToken(token, lang, country, sort, count, filter_score_with)
+
+    def stats(self) -> Dict[str, int]:
+        return {"search_calls": self.search_calls, "review_calls": self.review_calls}
+
+
+def install(fake: FakePlayStore) -> None:
+    """
+    Route play_store_service's scraper calls to `fake`.
+    """
+    from services import play_store_service
+
+    play_store_service.search = fake.search
+    play_store_service.reviews = fake.reviews
+
+
+def serve(host: str, port: int, fake: FakePlayStore) -> None:
+    """
+    Run the API with `fake` in place of the Play Store.
+    """
+    import uvicorn
+
+    install(fake)
+    from app import create_app
+
+    logger.info(f"Serving API on {host}:{port} with a fake Play Store of {len(fake.apps)} apps")
+    uvicorn.run(create_app(), host=host, port=port, log_level="warning")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    )
+    parser = argparse.ArgumentParser(description="Run the API against an offline fake Play Store")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--apps", type=int, default=200)
+    parser.add_argument("--reviews-per-app", type=int, default=1000)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="simulated delay per scraper call")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    serve(args.host, args.port, FakePlayStore(args.apps, args.reviews_per_app, args.latency_ms, args.seed))
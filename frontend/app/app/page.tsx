@@ -6,7 +6,7 @@ import AnalysisResult from '@/components/AnalysisResult';
 import Loader from '@/components/Loader';
 import Navbar from '@/components/Navbar';
 import SearchAppForm from '@/components/SearchAppForm';
-import { analyzeApp } from '@/lib/api';
+import { analyzeAppStream } from '@/lib/api';
 
 import { 
   Card, 
@@ -27,7 +27,11 @@ export default function HomePage() {
     setData(null);
     setLoading(true);
     try {
-      const res = await analyzeApp(appName);
+      // Show partial results as pages of reviews are scored
+      const res = await analyzeAppStream(appName, (partial) => {
+        setData(partial);
+        setLoading(false);
+      });
       setData(res);
     } catch (e: any) {
       setError(e.message || 'Unexpected error');
@@ -1,3 +1,5 @@
+import { AnalysisResponse } from '@/types';
+
 const BASE_URL = process.env.NEXT_PUBLIC_API_URL;
 
 export async function analyzeApp(appName: string) {
@@ -20,3 +22,52 @@ export async function searchApps(query: string) {
   if (!res.ok) return [];
   return res.json();
 }
+
+export type AnalysisEvent =
+  | ({ event: 'progress' | 'result' } & AnalysisResponse)
+  | { event: 'error'; status: number; detail: string };
+
+// Streams NDJSON events from /analyze/stream, calling onProgress with each
+// partial result; resolves with the final AnalysisResponse.
+export async function analyzeAppStream(
+  appName: string,
+  onProgress: (partial: AnalysisResponse) => void,
+): Promise<AnalysisResponse> {
+  const url = `${BASE_URL}/analyze/stream`;
+  const res = await fetch(url, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', Accept: 'application/x-ndjson' },
+    body: JSON.stringify({ appName }),
+  });
+  if (!res.ok || !res.body) {
+    const error = await res.json().catch(() => ({}));
+    throw new Error(error.detail || res.statusText);
+  }
+
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let result: AnalysisResponse | null = null;
+
+  const handle = (line: string) => {
+    if (!line.trim()) return;
+    const event = JSON.parse(line) as AnalysisEvent;
+    if (event.event === 'error') throw new Error(event.detail);
+    const { event: kind, ...data } = event;
+    if (kind === 'result') result = data;
+    else onProgress(data);
+  };
+
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    const lines = buffer.split('\n');
+    buffer = lines.pop() ?? '';
+    lines.forEach(handle);
+  }
+  handle(buffer);
+
+  if (!result) throw new Error('Analysis ended without a result');
+  return result;
+}